@@ -0,0 +1,77 @@
+"""
+Helpers to backfill log entries for rows that existed before audit logging was
+added.
+"""
+
+from textwrap import dedent
+from typing import Type
+
+from django.db.models import Model
+
+from .changes import row_sql
+from .sql import context_columns_sql, nest_sql, object_id_sql
+from .triggers import condition_sql, generates_log_entry_ids
+
+
+def backfill_snapshots_sql(
+    *,
+    audit_logged_model: Type[Model],
+    context_model: Type[Model],
+    log_entry_model: Type[Model],
+) -> str:
+    """
+    Generate the SQL to write a SNAPSHOT log entry with the current values of
+    every row in a range of primary keys, using the context in the temporary
+    context table. Rows that already have an insert or snapshot logged are
+    skipped, so the SQL can be run again to resume an interrupted backfill.
+
+    The SQL takes the content type id of the model, and the first and last
+    (exclusive) primary key of the range as parameters.
+    """
+
+    audit_logged_table = audit_logged_model._meta.db_table
+    pk_column = audit_logged_model._meta.pk.column
+    log_entry_table = log_entry_model._meta.db_table
+    context_fields = context_columns_sql(context_model)
+    # The context columns are qualified, as the audit logged table may have
+    # columns with the same names.
+    context_values = ", ".join(
+        f"context_row.{ column.strip() }" for column in context_fields.split(",")
+    )
+    changes = row_sql(audit_logged_model=audit_logged_model, row="logged_row")
+    object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=log_entry_model, row="logged_row"
+    )
+
+    id_column, id_value = "", ""
+    if generates_log_entry_ids(log_entry_model):
+        id_column = f"{ log_entry_model._meta.pk.column }, "
+        id_value = "audit_log_uuid_v7(), "
+
+    condition = condition_sql(audit_logged_model=audit_logged_model, row="logged_row")
+    condition = f"AND { condition }" if condition else ""
+
+    return dedent(
+        f"""
+        INSERT INTO { log_entry_table } (
+            { id_column }{ context_fields },
+            action, at, changes, content_type_id, object_id
+        ) SELECT
+            { id_value }{ context_values },
+            'SNAPSHOT' as action,
+            now() as at,
+            { nest_sql(changes, 12) } as changes,
+            %(content_type_id)s as content_type_id,
+            { object_id } as object_id
+        FROM { audit_logged_table } logged_row, { context_model._meta.db_table } context_row
+        WHERE logged_row.{ pk_column } >= %(start)s
+        AND logged_row.{ pk_column } < %(end)s
+        { condition }
+        AND NOT EXISTS (
+            SELECT 1 FROM { log_entry_table } entry
+            WHERE entry.content_type_id = %(content_type_id)s
+            AND entry.object_id = { object_id }
+            AND entry.action IN ('INSERT', 'SNAPSHOT')
+        )
+        """
+    ).strip()
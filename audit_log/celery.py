@@ -0,0 +1,44 @@
+"""
+Integration with Celery, to audit log changes made by tasks. This requires
+Celery to be installed, like with the celery extra of this package.
+"""
+from typing import Any, Type
+
+from celery import Task
+
+from . import context_managers, models, utils
+
+
+class AuditLoggedTask(Task):
+    """
+    A base class for Celery tasks that adds audit logging to the task, like
+    AuditLoggedCommand does for management commands. Use it as the base of a
+    task with `@app.task(base=AuditLoggedTask)`.
+
+    The temporary context table is created once for every database connection
+    of the worker, and only the context row is replaced for every task, so this
+    adds very little overhead to small tasks.
+    """
+
+    # The tasks using this as their base implement run
+    # pylint: disable=abstract-method
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+
+        context_model = utils.get_context_model()
+
+        with context_managers.persistent_audit_logging(
+            context_model=context_model,
+            create_context=lambda: self.create_context(context_model),
+            entry_point="celery-task",
+        ):
+            return super().__call__(*args, **kwargs)
+
+    def create_context(
+        self, context_model: Type[models.BaseContext]
+    ) -> models.BaseContext:
+        """
+        Create the context needed for audit logging changes made by this task.
+        """
+
+        return context_model.create_from_task(task=self)
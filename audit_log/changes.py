@@ -0,0 +1,284 @@
+"""
+SQL expressions for the changes logged by the trigger functions.
+"""
+
+import json
+from textwrap import dedent
+from typing import Any, Dict, Type
+
+from django.db.models import Model
+
+from .fields import get_audit_logs_field
+from .sql import nest_sql, quote_value
+
+
+def row_sql(*, audit_logged_model: Type[Model], row: str) -> str:
+    """
+    Generate the SQL expression that converts the given row variable in the
+    trigger (NEW or OLD) to a jsonb object, applying any value policies.
+    """
+
+    if not _value_policies(audit_logged_model):
+        return f"to_jsonb({ row }.*)"
+
+    value = _value_sql(audit_logged_model=audit_logged_model, column="col")
+    return dedent(
+        f"""
+        (
+            SELECT jsonb_object_agg(col.key, { nest_sql(value, 12) })
+            FROM jsonb_each(to_jsonb({ row }.*)) col
+        )
+        """
+    ).strip()
+
+
+def _value_sql(*, audit_logged_model: Type[Model], column: str) -> str:
+    """
+    Generate the SQL expression for the value logged for a column, given the
+    alias of a row from jsonb_each. This applies the value policy of the column
+    if it has one.
+    """
+
+    value_policies = _value_policies(audit_logged_model)
+    if not value_policies:
+        return f"{ column }.value"
+
+    cases = []
+    for column_name, policy in value_policies.items():
+        # Use the text representation of the value, without quotes for strings
+        text = f"({ column }.value #>> '{{}}')"
+        if policy == "md5":
+            value = f"to_jsonb(md5({ text }))"
+        elif policy == "sha256":
+            value = f"to_jsonb(encode(sha256(convert_to({ text }, 'UTF8')), 'hex'))"
+        else:
+            # Only truncate values that are too long, so short values keep
+            # their type
+            _, length = policy
+            value = (
+                f"CASE WHEN length({ text }) > { int(length) } "
+                f"THEN to_jsonb(left({ text }, { int(length) })) "
+                f"ELSE { column }.value END"
+            )
+        cases.append(f"WHEN { quote_value(column_name) } THEN { value }")
+
+    return "\n".join([f"CASE { column }.key", *cases, f"ELSE { column }.value", "END"])
+
+
+def _value_policies(model: Type[Model]) -> Dict[str, Any]:
+    """
+    Get the value policies of the model's AuditLogsField, by column name,
+    skipping columns where the full value should be logged.
+    """
+
+    field = get_audit_logs_field(model)
+    if field is None:
+        return {}
+
+    return {
+        model._meta.get_field(name).column: policy
+        for name, policy in field.value_policies.items()
+        if policy != "full"
+    }
+
+
+def update_changes_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL expression that computes the changes made by an update,
+    as a jsonb object with the column name as key and the old and new values in
+    an array.
+    """
+
+    old_value = _value_sql(audit_logged_model=audit_logged_model, column="old_row")
+    new_value = _value_sql(audit_logged_model=audit_logged_model, column="new_row")
+    value = dedent(
+        f"""
+        ARRAY[
+            { nest_sql(old_value, 12) },
+            { nest_sql(new_value, 12) }
+        ]
+        """
+    ).strip()
+
+    json_diff_columns = json_diff_columns_sql(audit_logged_model)
+    if json_diff_columns:
+        json_diff = _json_diff_sql(old_value="old_row.value", new_value="new_row.value")
+        value = dedent(
+            f"""
+            CASE WHEN COALESCE(old_row.key, new_row.key) IN ({ json_diff_columns })
+            THEN { nest_sql(json_diff, 12) }
+            ELSE to_jsonb({ nest_sql(value, 12) })
+            END
+            """
+        ).strip()
+
+    return dedent(
+        f"""
+        (
+            SELECT
+                -- Aggregate back to a single jsonb object, with
+                -- column name as key and the two values in an array.
+                jsonb_object_agg(
+                    COALESCE(old_row.key, new_row.key),
+                    { nest_sql(value, 20) }
+                )
+            FROM
+                -- Select key value pairs from the old and the new
+                -- row, and then join them on the key. THis gives
+                -- us rows with the same key and values from both
+                -- the old row and the new row.
+                jsonb_each(to_jsonb(OLD.*)) old_row
+                FULL OUTER JOIN
+                jsonb_each(to_jsonb(NEW.*)) new_row
+                ON old_row.key = new_row.key
+            WHERE
+                -- Only select rows that have actually changed
+                old_row.* IS DISTINCT FROM new_row.*
+        )
+        """
+    ).strip()
+
+
+def json_diff_columns_sql(model: Type[Model]) -> str:
+    """
+    Get the columns of the model that should be logged with a path-level diff,
+    as a comma separated list of quoted column names, or an empty string if
+    there are none.
+    """
+
+    field = get_audit_logs_field(model)
+    if field is None:
+        return ""
+
+    return ", ".join(
+        quote_value(model._meta.get_field(name).column)
+        for name in field.json_diff_fields
+    )
+
+
+def _json_diff_sql(*, old_value: str, new_value: str) -> str:
+    """
+    Generate the SQL expression that computes a path-level diff of two jsonb
+    values, as a jsonb array of the changed paths. Objects are walked
+    recursively, and every other kind of value is compared as a whole.
+    """
+
+    return dedent(
+        f"""
+        (
+            WITH RECURSIVE paths(path, old_value, new_value) AS (
+                SELECT ARRAY[]::text[], { old_value }, { new_value }
+                UNION ALL
+                SELECT
+                    paths.path || keys.key,
+                    paths.old_value -> keys.key,
+                    paths.new_value -> keys.key
+                FROM paths, LATERAL (
+                    -- The keys are only used when both values are objects,
+                    -- but jsonb_object_keys fails on anything else, so
+                    -- guard against that here as well.
+                    SELECT jsonb_object_keys(CASE
+                        WHEN jsonb_typeof(paths.old_value) = 'object'
+                        THEN paths.old_value ELSE '{{}}'::jsonb
+                    END)
+                    UNION
+                    SELECT jsonb_object_keys(CASE
+                        WHEN jsonb_typeof(paths.new_value) = 'object'
+                        THEN paths.new_value ELSE '{{}}'::jsonb
+                    END)
+                ) keys(key)
+                WHERE jsonb_typeof(paths.old_value) = 'object'
+                AND jsonb_typeof(paths.new_value) = 'object'
+                AND paths.old_value IS DISTINCT FROM paths.new_value
+            )
+            SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'op', CASE
+                    WHEN old_value IS NULL THEN 'add'
+                    WHEN new_value IS NULL THEN 'remove'
+                    ELSE 'replace'
+                END,
+                'path', to_jsonb(path),
+                'old', old_value,
+                'new', new_value
+            ) ORDER BY path), '[]'::jsonb)
+            FROM paths
+            WHERE old_value IS DISTINCT FROM new_value
+            -- Objects that differ are represented by the changes to their keys
+            AND NOT (
+                jsonb_typeof(old_value) = 'object'
+                AND jsonb_typeof(new_value) = 'object'
+            )
+        )
+        """
+    ).strip()
+
+
+def non_default_changes_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL expression that computes the changes logged for an insert
+    when only columns that differ from their default value should be logged.
+    """
+
+    defaults = quote_value(json.dumps(_default_values(audit_logged_model)))
+    value = _value_sql(audit_logged_model=audit_logged_model, column="new_row")
+
+    return dedent(
+        f"""
+        COALESCE((
+            SELECT jsonb_object_agg(new_row.key, { nest_sql(value, 12) })
+            FROM jsonb_each(to_jsonb(NEW.*)) new_row
+            -- Skip columns that have their default value
+            WHERE ({ defaults }::jsonb -> new_row.key) IS DISTINCT FROM new_row.value
+        ), '{{}}'::jsonb)
+        """
+    ).strip()
+
+
+def _default_values(model: Type[Model]) -> Dict[str, Any]:
+    """
+    Get the default value of the model's columns, for the columns where the
+    default is a constant with the same JSON representation in Python and in
+    PostgreSQL. Nullable columns without a default default to null.
+    """
+
+    defaults = {}
+    for field in model._meta.concrete_fields:
+        if field.has_default():
+            value = field.default
+        elif field.null:
+            value = None
+        else:
+            continue
+
+        if value is None or isinstance(value, (bool, int, float, str)):
+            defaults[field.column] = value
+
+    return defaults
+
+
+def pk_only_changes_sql(
+    *, audit_logged_model: Type[Model], log_entry_table_name: str, object_id: str
+) -> str:
+    """
+    Generate the SQL expression that computes the changes logged for a delete
+    when only the primary key should be logged. The full row is still logged
+    if there is no insert or snapshot logged for the row, as it would otherwise
+    be lost.
+    """
+
+    pk_column = audit_logged_model._meta.pk.column
+    row = row_sql(audit_logged_model=audit_logged_model, row="OLD")
+
+    return dedent(
+        f"""
+        CASE WHEN EXISTS (
+            SELECT 1 FROM { log_entry_table_name } entry
+            WHERE entry.content_type_id = content_type_id
+            AND entry.object_id = { object_id }
+            AND entry.action IN ('INSERT', 'SNAPSHOT')
+        )
+        THEN jsonb_build_object('{ pk_column }', OLD.{ pk_column })
+        ELSE { nest_sql(row, 8) }
+        END
+        """
+    ).strip()
@@ -1,9 +1,22 @@
+import json
+import time
+import weakref
 from contextlib import contextmanager
-from typing import Callable, Generator, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Generator,
+    List,
+    Mapping,
+    Optional,
+    Type,
+    TypeVar,
+)
 
-from django.db import connection
+from django.db import connection, transaction
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
 
-from . import models
+from . import models, signals, utils
 
 ContextModel = TypeVar("ContextModel", bound=models.BaseContext)
 
@@ -14,18 +27,266 @@ def audit_logging(
     create_temporary_table_sql: str,
     drop_temporary_table_sql: str,
     create_context: Callable[[], ContextModel],
+    entry_point: str = "unknown",
 ) -> Generator[ContextModel, None, None]:
     """
     Context manager to enable audit logging, and cleaning up afterwards.
+
+    The entry point is used to tag the instrumentation signals sent for each
+    step, so it's possible to tell the overhead of e.g. requests and management
+    commands apart.
+
+    Audit logging contexts can be nested, like when calling a management
+    command from a request. The inner context then replaces the context of the
+    outer one until it exits, without creating another temporary table.
+
+    If persistent_audit_logging already left the temporary table on the
+    connection, that table is reused and only cleared afterwards.
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(create_temporary_table_sql)
+    stack = _context_stack()
+    if stack:
+        with _nested_context(
+            stack=stack, create_context=create_context, entry_point=entry_point
+        ) as context:
+            yield context
+        return
+
+    has_table = connection.connection in _connections_with_context_table
+    if not has_table:
+        with _instrument(step="create_table", entry_point=entry_point):
+            with connection.cursor() as cursor:
+                cursor.execute(create_temporary_table_sql)
+
+    with _instrument(step="create_context", entry_point=entry_point):
+        context = create_context()
+
+    stack.append(context)
+    try:
+        yield context
+    finally:
+        stack.pop()
+        if has_table:
+            with _instrument(step="clear_context", entry_point=entry_point):
+                with connection.cursor() as cursor:
+                    cursor.execute(utils.clear_temporary_table_sql(type(context)))
+        else:
+            with _instrument(step="drop_table", entry_point=entry_point):
+                with connection.cursor() as cursor:
+                    cursor.execute(drop_temporary_table_sql)
+
+
+# The stack of active audit logging contexts for each raw database connection,
+# to allow nesting them.
+_context_stacks: "weakref.WeakKeyDictionary[Any, List[models.BaseContext]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _context_stack() -> List[models.BaseContext]:
+    """
+    Get the stack of active audit logging contexts for the current database
+    connection, with the innermost context last.
+    """
+
+    connection.ensure_connection()
+    return _context_stacks.setdefault(connection.connection, [])
+
+
+@contextmanager
+def _nested_context(
+    *,
+    stack: List[models.BaseContext],
+    create_context: Callable[[], ContextModel],
+    entry_point: str,
+) -> Generator[ContextModel, None, None]:
+    """
+    Replace the context of the current audit logging context in the wrapped
+    block, and restore it afterwards. This reuses the temporary context table,
+    so only the context row is replaced.
+    """
 
-    context = create_context()
+    outer_context = stack[-1]
+    clear_temporary_table_sql = utils.clear_temporary_table_sql(type(outer_context))
 
+    with _instrument(step="create_context", entry_point=entry_point):
+        with connection.cursor() as cursor:
+            cursor.execute(clear_temporary_table_sql)
+        context = create_context()
+
+    stack.append(context)
     try:
         yield context
     finally:
+        stack.pop()
+        # If the transaction failed the context can't be restored, but rolling
+        # back the transaction also restores the context table.
+        transaction_status = connection.connection.get_transaction_status()
+        if transaction_status != TRANSACTION_STATUS_INERROR:
+            with _instrument(step="restore_context", entry_point=entry_point):
+                with connection.cursor() as cursor:
+                    cursor.execute(clear_temporary_table_sql)
+                outer_context.save(force_insert=True)
+
+
+# The raw database connections known to have the temporary context table used by
+# persistent_audit_logging. This is tracked by raw connection, so the table is
+# created again when Django reconnects.
+_connections_with_context_table: "weakref.WeakSet[Any]" = weakref.WeakSet()
+
+
+@contextmanager
+def persistent_audit_logging(
+    *,
+    context_model: Type[models.BaseContext],
+    create_context: Callable[[], ContextModel],
+    entry_point: str = "unknown",
+) -> Generator[ContextModel, None, None]:
+    """
+    Context manager to enable audit logging, like audit_logging, but keeping
+    the temporary context table for the lifetime of the database connection.
+    Only the context row is replaced for every use, so this doesn't run any DDL
+    once the table exists. This is meant for workers that run many small tasks
+    on a long lived connection.
+    """
+
+    stack = _context_stack()
+    if stack:
+        with _nested_context(
+            stack=stack, create_context=create_context, entry_point=entry_point
+        ) as context:
+            yield context
+        return
+
+    raw_connection = connection.connection
+    if raw_connection not in _connections_with_context_table:
+        with _instrument(step="create_table", entry_point=entry_point):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT to_regclass(%s)",
+                    [f"pg_temp.{context_model._meta.db_table}"],
+                )
+                if cursor.fetchone()[0] is None:
+                    cursor.execute(utils.create_temporary_table_sql(context_model))
+
+        # A table created in a transaction is gone if the transaction is rolled
+        # back, so only remember it once it's committed.
+        transaction.on_commit(
+            lambda: _connections_with_context_table.add(raw_connection)
+        )
+
+    with _instrument(step="create_context", entry_point=entry_point):
         with connection.cursor() as cursor:
-            cursor.execute(drop_temporary_table_sql)
+            cursor.execute(utils.clear_temporary_table_sql(context_model))
+        context = create_context()
+
+    stack.append(context)
+    try:
+        yield context
+    finally:
+        stack.pop()
+        with _instrument(step="clear_context", entry_point=entry_point):
+            with connection.cursor() as cursor:
+                cursor.execute(utils.clear_temporary_table_sql(context_model))
+
+
+@contextmanager
+def summary_logging() -> Generator[None, None, None]:
+    """
+    Context manager to enable summary mode, where changes to models that allow
+    it are logged with a single log entry per statement instead of one per row.
+    This is meant for bulk operations, like maintenance jobs, where the
+    individual changes are not interesting.
+
+    Summary mode is a setting on the database session, so it also applies to
+    changes made by raw SQL, and is restored to its previous value afterwards.
+    """
+
+    with _session_setting("audit_log.summary_mode", "on"):
+        yield
+
+
+@contextmanager
+def fallback_context(
+    *,
+    context_type: str,
+    context: Mapping[str, Any],
+    performed_by_id: Optional[int] = None,
+) -> Generator[None, None, None]:
+    """
+    Context manager to set the context changes are logged with when there is no
+    audit logging context, instead of failing. This is a lot cheaper than
+    setting up audit logging context, as it doesn't create any tables, so it's
+    useful for code like background workers that write to audit logged models
+    in a loop, but don't need detailed context.
+
+    The fallback context is a setting on the database session, and is restored
+    to its previous value afterwards. A default for all connections can be set
+    with the AUDIT_LOG_FALLBACK_CONTEXT setting.
+    """
+
+    value = json.dumps(
+        {
+            "context_type": context_type,
+            "context": context,
+            "performed_by_id": performed_by_id,
+        }
+    )
+    with _session_setting("audit_log.fallback_context", value):
+        yield
+
+
+@contextmanager
+def _session_setting(name: str, value: str) -> Generator[None, None, None]:
+    """
+    Change a setting for the database session in the wrapped block, and restore
+    it to its previous value afterwards.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT current_setting(%s, true), set_config(%s, %s, false)",
+            [name, name, value],
+        )
+        (previous, _) = cursor.fetchone()
+
+    try:
+        yield
+    finally:
+        # If the transaction failed the setting can't be restored, but rolling
+        # back the transaction also restores it.
+        transaction_status = connection.connection.get_transaction_status()
+        if transaction_status != TRANSACTION_STATUS_INERROR:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config(%s, %s, false)", [name, previous or ""]
+                )
+
+
+@contextmanager
+def _instrument(*, step: str, entry_point: str) -> Generator[None, None, None]:
+    """
+    Time the wrapped block and count the number of statements executed in it,
+    and report it through the audit_logging_step signal. This is a no-op when
+    nobody is listening to the signal, to avoid any overhead in that case.
+    """
+
+    if not signals.audit_logging_step.has_listeners(sender=entry_point):
+        yield
+        return
+
+    statements = 0
+
+    def count_statements(execute: Callable, *args: Any) -> Any:
+        nonlocal statements
+        statements += 1
+        return execute(*args)
+
+    start = time.perf_counter()
+    with connection.execute_wrapper(count_statements):
+        yield
+    duration = time.perf_counter() - start
+
+    signals.audit_logging_step.send(
+        sender=entry_point, step=step, duration=duration, statements=statements
+    )
@@ -1,13 +1,34 @@
+import json
+
+from django.conf import settings
 from django.db.backends.postgresql.base import (
     DatabaseWrapper as PostgreSQLDatabaseWrapper,
 )
 
+from .operations import DatabaseOperations
 from .schema import SchemaEditor
 
 
 class DatabaseWrapper(PostgreSQLDatabaseWrapper):
     """
-    A subclass of the PostgreSQL databasw wrapper with an extended schema editor.
+    A subclass of the PostgreSQL databasw wrapper with an extended schema editor
+    and database operations.
     """
 
     SchemaEditorClass = SchemaEditor  # type: ignore
+    ops_class = DatabaseOperations
+
+    def init_connection_state(self) -> None:
+        super().init_connection_state()
+
+        # Set the default context to log changes with when there is no audit
+        # logging context for the connection.
+        fallback_context = getattr(settings, "AUDIT_LOG_FALLBACK_CONTEXT", None)
+        if fallback_context is not None:
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('audit_log.fallback_context', %s, false)",
+                    [json.dumps(fallback_context)],
+                )
+            if not self.get_autocommit():
+                self.connection.commit()
@@ -0,0 +1,40 @@
+"""
+This defines a custom DatabaseOperations class with some extensions.
+"""
+from typing import Any, List, Sequence
+
+from django.db.backends.postgresql.operations import (
+    DatabaseOperations as PostgreSQLDatabaseOperations,
+)
+
+
+class DatabaseOperations(PostgreSQLDatabaseOperations):
+    """
+    A subclass of the normal PostgreSQL database operations that keeps the
+    audit logging triggers out of the way when flushing the database.
+    """
+
+    # pylint: disable=abstract-method
+
+    def sql_flush(
+        self,
+        style: Any,
+        tables: Sequence[str],
+        *,
+        reset_sequences: bool = False,
+        allow_cascade: bool = False,
+    ) -> List[str]:
+
+        sql = super().sql_flush(
+            style,
+            tables,
+            reset_sequences=reset_sequences,
+            allow_cascade=allow_cascade,
+        )
+        if not sql:
+            return sql
+
+        # Flushing truncates all tables, usually without any audit logging
+        # context, so mark the transaction to skip logging the truncates. The
+        # flush is always run in a transaction, so this only affects the flush.
+        return ["SET LOCAL audit_log.flushing = 'on';", *sql]
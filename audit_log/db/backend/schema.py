@@ -8,7 +8,7 @@ from django.db.backends.postgresql.schema import (
 )
 from django.db.models import Field, Model
 
-from ... import utils
+from ... import fields, history, locking, triggers, utils
 
 
 class SchemaEditor(PostgreSQLSchemaEditor):
@@ -29,27 +29,55 @@ class SchemaEditor(PostgreSQLSchemaEditor):
 
         super().create_model(model)
 
-        if utils.has_audit_logs_field(model):
+        if fields.has_audit_logs_field(model):
             self.create_audit_logging_triggers(audit_logged_model=model)
 
     def delete_model(self, model: Type[Model]) -> None:
 
-        if utils.has_audit_logs_field(model):
+        audit_logs_field = fields.get_audit_logs_field(model)
+        if audit_logs_field is not None:
             self.drop_audit_logging_triggers(audit_logged_model=model)
 
-        super().create_model(model)
+        super().delete_model(model)
+
+        # The history table is kept when audit logging is removed, but not
+        # when the model is removed.
+        if audit_logs_field is not None and audit_logs_field.history:
+            self.execute(history.drop_history_table_sql(audit_logged_model=model))
 
     def add_field(self, model: Type[Model], field: Field) -> None:
         super().add_field(model, field)
 
-        if utils.is_audit_logs_field(field):
-            self.create_audit_logging_triggers(audit_logged_model=model)
+        if fields.is_audit_logs_field(field):
+            # The model is the version from before the field was added, while
+            # the triggers depend on the options of the field, so use the
+            # model the field belongs to instead.
+            self.create_audit_logging_triggers(audit_logged_model=field.model)
 
     def remove_field(self, model: Type[Model], field: Field) -> None:
         super().remove_field(model, field)
 
-        if utils.is_audit_logs_field(field):
+        if fields.is_audit_logs_field(field):
+            self.drop_audit_logging_triggers(audit_logged_model=model)
+
+    def alter_field(
+        self,
+        model: Type[Model],
+        old_field: Field,
+        new_field: Field,
+        strict: bool = False,
+    ) -> None:
+
+        if fields.is_audit_logs_field(old_field) and fields.is_audit_logs_field(
+            new_field
+        ):
+            # The field has no column, but the triggers depend on its options,
+            # so recreate them from the new version of the model.
             self.drop_audit_logging_triggers(audit_logged_model=model)
+            self.create_audit_logging_triggers(audit_logged_model=new_field.model)
+            return
+
+        super().alter_field(model, old_field, new_field, strict=strict)
 
     ####################
     # Internal helpers #
@@ -65,13 +93,16 @@ class SchemaEditor(PostgreSQLSchemaEditor):
             context_model=self._context_model,
             log_entry_model=self._log_entry_model,
         )
-        for query in sql:
-            self.execute(query)
+        locking.execute_with_lock_timeout(
+            schema_editor=self,
+            sql=sql,
+            description=f"add audit logging to {audit_logged_model._meta.db_table}",
+        )
 
         # Create the content type deferred, as the table isn't properly set up
         # when this code runs when not running migrations (ie. testing with syncdb)
         self.deferred_sql.append(
-            utils.create_content_type_sql(audit_logged_model=audit_logged_model)
+            triggers.create_content_type_sql(audit_logged_model=audit_logged_model)
         )
 
     def drop_audit_logging_triggers(self, *, audit_logged_model: Type[Model]) -> None:
@@ -80,5 +111,10 @@ class SchemaEditor(PostgreSQLSchemaEditor):
         """
 
         sql = utils.remove_audit_logging_sql(audit_logged_model=audit_logged_model)
-        for query in sql:
-            self.execute(query)
+        locking.execute_with_lock_timeout(
+            schema_editor=self,
+            sql=sql,
+            description=(
+                f"remove audit logging from {audit_logged_model._meta.db_table}"
+            ),
+        )
@@ -1,17 +1,40 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple, Type
+
 from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.loader import MigrationLoader
 from django.db.migrations.operations.base import Operation
 from django.db.migrations.state import ProjectState
+from django.db.models import Model
 
-from ... import utils
+from ... import locking, storage, utils
+from ...fields import get_audit_logs_field, has_audit_logs_field
 
 
 class AddAuditLogging(Operation):
     """
     Add audit logging triggers to the specified model.
+
+    On busy tables, set a lock_timeout (like "2s") to avoid queueing up behind
+    long running transactions while blocking all other queries on the table.
+    The triggers are then added in a short transaction, which is retried up to
+    the given number of times if the lock can't be acquired in time. Use this
+    in a non-atomic migration, so the transaction is committed right away.
     """
 
-    def __init__(self, *, model: str) -> None:
+    def __init__(
+        self,
+        *,
+        model: str,
+        lock_timeout: Optional[str] = None,
+        retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+    ) -> None:
         self.model = model
+        self.lock_options: Dict[str, Any] = {
+            "lock_timeout": lock_timeout,
+            "retries": retries,
+            "retry_delay": retry_delay,
+        }
 
     def state_forwards(self, app_label: str, state: ProjectState) -> None:
         pass
@@ -31,8 +54,12 @@ class AddAuditLogging(Operation):
             log_entry_model=utils.get_log_entry_model(to_state.apps),
         )
 
-        for query in sql:
-            schema_editor.execute(query)
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=sql,
+            description=f"add audit logging to {model._meta.db_table}",
+            **self.lock_options,
+        )
 
     def database_backwards(
         self,
@@ -44,8 +71,12 @@ class AddAuditLogging(Operation):
         model = from_state.apps.get_model(app_label, self.model)
         sql = utils.remove_audit_logging_sql(audit_logged_model=model)
 
-        for query in sql:
-            schema_editor.execute(query)
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=sql,
+            description=f"remove audit logging from {model._meta.db_table}",
+            **self.lock_options,
+        )
 
     def describe(self) -> str:
         return f"Add audit logging to {self.model}"
@@ -53,11 +84,24 @@ class AddAuditLogging(Operation):
 
 class RemoveAuditLogging(Operation):
     """
-    Remove audit logging triggers from the specified model.
+    Remove audit logging triggers from the specified model. This takes the same
+    lock options as AddAuditLogging.
     """
 
-    def __init__(self, *, model: str) -> None:
+    def __init__(
+        self,
+        *,
+        model: str,
+        lock_timeout: Optional[str] = None,
+        retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+    ) -> None:
         self.model = model
+        self.lock_options: Dict[str, Any] = {
+            "lock_timeout": lock_timeout,
+            "retries": retries,
+            "retry_delay": retry_delay,
+        }
 
     def state_forwards(self, app_label: str, state: ProjectState) -> None:
         pass
@@ -72,8 +116,12 @@ class RemoveAuditLogging(Operation):
         model = to_state.apps.get_model(app_label, self.model)
         sql = utils.remove_audit_logging_sql(audit_logged_model=model)
 
-        for query in sql:
-            schema_editor.execute(query)
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=sql,
+            description=f"remove audit logging from {model._meta.db_table}",
+            **self.lock_options,
+        )
 
     def database_backwards(
         self,
@@ -90,8 +138,273 @@ class RemoveAuditLogging(Operation):
             log_entry_model=utils.get_log_entry_model(from_state.apps),
         )
 
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=sql,
+            description=f"add audit logging to {model._meta.db_table}",
+            **self.lock_options,
+        )
+
+    def describe(self) -> str:
+        return f"Remove audit logging from {self.model}"
+
+
+class AddAuditLoggingBulk(Operation):
+    """
+    Add audit logging triggers to all of the specified models at once. The SQL
+    for all models is executed together, which saves a lot of round trips when
+    adding audit logging to many models. This takes the same lock options as
+    AddAuditLogging, but note that the locks of all tables are then acquired in
+    the same transaction.
+    """
+
+    def __init__(
+        self,
+        *,
+        models: Sequence[str],
+        lock_timeout: Optional[str] = None,
+        retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+    ) -> None:
+        self.models = models
+        self.lock_options: Dict[str, Any] = {
+            "lock_timeout": lock_timeout,
+            "retries": retries,
+            "retry_delay": retry_delay,
+        }
+
+    def state_forwards(self, app_label: str, state: ProjectState) -> None:
+        pass
+
+    def get_models(self, app_label: str, state: ProjectState) -> List[Type[Model]]:
+        """
+        Get the models to add audit logging to, from the given state.
+        """
+
+        return [state.apps.get_model(app_label, model) for model in self.models]
+
+    def database_forwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        context_model = utils.get_context_model(to_state.apps)
+        log_entry_model = utils.get_log_entry_model(to_state.apps)
+
+        models = self.get_models(app_label, to_state)
+        sql = []
+        for model in models:
+            sql.extend(
+                utils.add_audit_logging_sql(
+                    audit_logged_model=model,
+                    context_model=context_model,
+                    log_entry_model=log_entry_model,
+                )
+            )
+
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=[utils.join_sql(sql)],
+            description=f"add audit logging to {len(models)} models",
+            **self.lock_options,
+        )
+
+    def database_backwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        models = self.get_models(app_label, from_state)
+        sql = []
+        for model in models:
+            sql.extend(utils.remove_audit_logging_sql(audit_logged_model=model))
+
+        locking.execute_with_lock_timeout(
+            schema_editor=schema_editor,
+            sql=[utils.join_sql(sql)],
+            description=f"remove audit logging from {len(models)} models",
+            **self.lock_options,
+        )
+
+    def describe(self) -> str:
+        return f"Add audit logging to {', '.join(self.models)}"
+
+
+class AddAuditLoggingToApp(AddAuditLoggingBulk):
+    """
+    Add audit logging triggers to all models in the app of the migration, like
+    AddAuditLoggingBulk. Models that are already audit logged, either through
+    an AuditLogsField or with AddAuditLogging or AddAuditLoggingBulk in earlier
+    migrations of the app, log entry models, the last change and rollup models,
+    unmanaged and proxy models are skipped, as are the models listed in exclude.
+
+    The models are determined from the migration files, not the database, so
+    reversing this only removes audit logging from the models it added.
+    """
+
+    def __init__(
+        self,
+        *,
+        exclude: Sequence[str] = (),
+        lock_timeout: Optional[str] = None,
+        retries: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+    ) -> None:
+        super().__init__(
+            models=[],
+            lock_timeout=lock_timeout,
+            retries=retries,
+            retry_delay=retry_delay,
+        )
+        self.exclude = exclude
+
+    def get_audit_logged_model_names(self, app_label: str) -> Set[str]:
+        """
+        Get the names of the models of the app that migrations before this one
+        audit logged with AddAuditLogging or AddAuditLoggingBulk.
+        """
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        plan: List[Tuple[str, str]] = []
+        for leaf in loader.graph.leaf_nodes(app_label):
+            plan.extend(
+                key
+                for key in loader.graph.forwards_plan(leaf)
+                if key[0] == app_label and key not in plan
+            )
+
+        model_names: Set[str] = set()
+        for key in plan:
+            operations = loader.graph.nodes[key].operations
+            if any(
+                operation.deconstruct() == self.deconstruct()
+                for operation in operations
+            ):
+                break
+
+            for operation in operations:
+                if isinstance(operation, AddAuditLoggingToApp):
+                    continue
+                if isinstance(operation, AddAuditLogging):
+                    model_names.add(operation.model.lower())
+                elif isinstance(operation, RemoveAuditLogging):
+                    model_names.discard(operation.model.lower())
+                elif isinstance(operation, AddAuditLoggingBulk):
+                    model_names.update(model.lower() for model in operation.models)
+
+        return model_names
+
+    def get_models(self, app_label: str, state: ProjectState) -> List[Type[Model]]:
+
+        all_models = list(state.apps.get_models())
+        log_entry_models = {utils.get_log_entry_model(state.apps)}
+        for model in all_models:
+            field = get_audit_logs_field(model)
+            if field is not None:
+                log_entry_models.add(field.remote_field.model)
+
+        # The last change and rollup tables are written to by the triggers as
+        # well, and might not be part of the migration state yet.
+        internal_labels = {
+            model._meta.label_lower
+            for model in (utils.get_last_change_model(), utils.get_rollup_model())
+            if model is not None
+        }
+
+        excluded = {model_name.lower() for model_name in self.exclude}
+        excluded |= self.get_audit_logged_model_names(app_label)
+
+        return [
+            model
+            for model in all_models
+            if model._meta.app_label == app_label
+            and model._meta.managed
+            and not model._meta.proxy
+            and not has_audit_logs_field(model)
+            and model not in log_entry_models
+            and model._meta.label_lower not in internal_labels
+            and model._meta.model_name not in excluded
+        ]
+
+    def describe(self) -> str:
+        return "Add audit logging to all models in the app"
+
+
+class AlterLogEntryStorage(Operation):
+    """
+    Tune how the specified log entry model is stored. Log entries are written
+    once and never updated, so it can be worth using a cheaper compression
+    method (like lz4, available from PostgreSQL 14) for the JSON fields, and
+    storage parameters suited for an insert-only table.
+
+    With a sequence cache, each database session preallocates that many ids
+    from the id sequence, so concurrent writers don't all wait for the
+    sequence. Ids are then no longer in the order the log entries were
+    written, and sessions leave gaps of unused ids.
+
+    Reversing this resets the compression, the storage parameters and the
+    sequence cache to the database defaults.
+    """
+
+    def __init__(
+        self,
+        *,
+        model: str,
+        compression: Optional[str] = None,
+        fields: Sequence[str] = ("changes", "context"),
+        storage_parameters: Optional[Mapping[str, Any]] = None,
+        sequence_cache: Optional[int] = None,
+    ) -> None:
+        self.model = model
+        self.compression = compression
+        self.fields = fields
+        self.storage_parameters = storage_parameters or {}
+        self.sequence_cache = sequence_cache
+
+    def state_forwards(self, app_label: str, state: ProjectState) -> None:
+        pass
+
+    def database_forwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        model = to_state.apps.get_model(app_label, self.model)
+        sql = storage.alter_storage_sql(
+            model=model,
+            field_names=self.fields,
+            compression=self.compression,
+            storage_parameters=self.storage_parameters,
+            sequence_cache=self.sequence_cache,
+        )
+
+        for query in sql:
+            schema_editor.execute(query)
+
+    def database_backwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        model = from_state.apps.get_model(app_label, self.model)
+        sql = storage.reset_storage_sql(
+            model=model,
+            field_names=self.fields,
+            compression=self.compression,
+            storage_parameters=self.storage_parameters,
+            sequence_cache=self.sequence_cache,
+        )
+
         for query in sql:
             schema_editor.execute(query)
 
     def describe(self) -> str:
-        return f"Remove audit logging from {self.model}"
+        return f"Alter storage of {self.model}"
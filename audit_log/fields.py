@@ -1,12 +1,35 @@
-from typing import Any, Dict, List, Optional, Tuple, Type
+from datetime import datetime
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
+from django.apps import apps
 from django.conf import settings
 from django.contrib.contenttypes.fields import (
+    GenericForeignKey,
     GenericRelation,
     ReverseGenericManyToOneDescriptor,
 )
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured
 from django.db import DEFAULT_DB_ALIAS, models
 from django.db.models.fields.related import lazy_related_operation  # type: ignore
+from django.utils.functional import cached_property
+
+from .history import as_of_sql
+
+INSERT_PAYLOADS = ("full", "non_default")
+DELETE_PAYLOADS = ("full", "pk_only")
+VALUE_POLICIES = ("full", "md5", "sha256")
 
 
 class AuditLogsField(GenericRelation):
@@ -15,6 +38,19 @@ class AuditLogsField(GenericRelation):
     for that object (and also allow prefetching etc). This field is also used as
     a marker in the custom database engine to detect models we should add the
     audit logging trigger to.
+
+    The options, which are described in the README:
+
+    - to: The log entry model to log the changes to.
+    - condition: A Q object or SQL predicate limiting the rows that are logged.
+    - coalesce_changes: Merge the changes to a row within a transaction.
+    - insert_payload: "full", or "non_default" to skip columns with defaults.
+    - delete_payload: "full", or "pk_only" to only log the primary key.
+    - value_policies: Log a hash or a truncated value of the given fields.
+    - json_diff_fields: Log path-level diffs of the given JSON fields.
+    - truncate_row_count: Count the rows removed by a truncate.
+    - allow_summary_logging: Log one entry per statement in summary mode.
+    - history: Keep every version of the rows in a history table.
     """
 
     model: Type[models.Model]
@@ -24,8 +60,51 @@ class AuditLogsField(GenericRelation):
     concrete = False
     hidden = True
 
-    def __init__(self, to: str = settings.AUDIT_LOG_ENTRY_MODEL):
+    def __init__(
+        self,
+        to: str = settings.AUDIT_LOG_ENTRY_MODEL,
+        *,
+        condition: Union[models.Q, str, None] = None,
+        coalesce_changes: bool = False,
+        insert_payload: str = "full",
+        delete_payload: str = "full",
+        value_policies: Optional[Mapping[str, Union[str, Tuple[str, int]]]] = None,
+        json_diff_fields: Sequence[str] = (),
+        truncate_row_count: bool = False,
+        allow_summary_logging: bool = False,
+        history: bool = False,
+    ):
+        if insert_payload not in INSERT_PAYLOADS:
+            raise ValueError(f"insert_payload must be one of {INSERT_PAYLOADS}")
+        if delete_payload not in DELETE_PAYLOADS:
+            raise ValueError(f"delete_payload must be one of {DELETE_PAYLOADS}")
+        for policy in (value_policies or {}).values():
+            if not _is_valid_value_policy(policy):
+                raise ValueError(
+                    f"Value policies must be one of {VALUE_POLICIES} "
+                    "or ('truncate', length)"
+                )
+        if set(json_diff_fields) & set(value_policies or {}):
+            raise ValueError(
+                "Fields in json_diff_fields can't also have a value policy"
+            )
+
+        if history and allow_summary_logging:
+            raise ValueError(
+                "history can't be combined with allow_summary_logging, as changes "
+                "logged in summary mode are not added to the history"
+            )
+
         super().__init__(to=to)
+        self.condition = condition
+        self.coalesce_changes = coalesce_changes
+        self.insert_payload = insert_payload
+        self.delete_payload = delete_payload
+        self.value_policies = dict(value_policies or {})
+        self.json_diff_fields = list(json_diff_fields)
+        self.truncate_row_count = truncate_row_count
+        self.allow_summary_logging = allow_summary_logging
+        self.history = history
 
     def contribute_to_class(
         self, cls: Type[models.Model], name: str, private_only: bool = False
@@ -40,7 +119,7 @@ class AuditLogsField(GenericRelation):
         setattr(
             cls,
             self.name,
-            ReverseGenericManyToOneDescriptor(self.remote_field),  # type: ignore
+            AuditLogsDescriptor(self.remote_field),  # type: ignore
         )
 
         self.opts = cls._meta
@@ -63,11 +142,31 @@ class AuditLogsField(GenericRelation):
         else:
             to = self.remote_field.model._meta.label_lower
 
+        kwargs: Dict[str, Any] = {"to": to}
+        if self.condition is not None:
+            kwargs["condition"] = self.condition
+        if self.coalesce_changes:
+            kwargs["coalesce_changes"] = True
+        if self.insert_payload != "full":
+            kwargs["insert_payload"] = self.insert_payload
+        if self.delete_payload != "full":
+            kwargs["delete_payload"] = self.delete_payload
+        if self.value_policies:
+            kwargs["value_policies"] = self.value_policies
+        if self.json_diff_fields:
+            kwargs["json_diff_fields"] = self.json_diff_fields
+        if self.truncate_row_count:
+            kwargs["truncate_row_count"] = True
+        if self.allow_summary_logging:
+            kwargs["allow_summary_logging"] = True
+        if self.history:
+            kwargs["history"] = True
+
         return (
             self.name,
             f"{self.__class__.__module__}.{self.__class__.__qualname__}",
             [],
-            {"to": to},
+            kwargs,
         )
 
     def bulk_related_objects(
@@ -82,3 +181,130 @@ class AuditLogsField(GenericRelation):
         # pylint: disable=protected-access
 
         return self.remote_field.model._base_manager.none()  # type: ignore
+
+
+class AuditLogsDescriptor(ReverseGenericManyToOneDescriptor):
+    """
+    Descriptor for the AuditLogsField. On top of the log entries of an object,
+    this gives access to the last change of objects when the
+    AUDIT_LOG_LAST_CHANGE_MODEL setting is set, either for a single object
+    through obj.audit_logs.last_change(), or for a list of objects through
+    Model.audit_logs.last_changes(objs).
+    """
+
+    @cached_property
+    def related_manager_cls(self) -> Type[models.Manager]:
+
+        # pylint: disable=invalid-overridden-method
+
+        descriptor = self
+
+        class AuditLogsManager(super().related_manager_cls):  # type: ignore
+            """
+            Manager for the log entries of an object.
+            """
+
+            def last_change(self) -> Optional[models.Model]:
+                """
+                Get the last change of the object, or None if it has no
+                tracked changes.
+                """
+
+                return descriptor.last_changes([self.instance]).get(self.instance.pk)
+
+        return AuditLogsManager
+
+    def as_of(self, at: datetime) -> models.query.RawQuerySet:
+        """
+        Get the objects as they were at the given time, from the history table
+        of the model. This requires history to be enabled on the field.
+        """
+
+        if not self.field.history:
+            raise ValueError(f"History is not enabled for {self.field.model.__name__}")
+
+        sql = as_of_sql(audit_logged_model=self.field.model)
+        # pylint: disable=protected-access
+        return self.field.model._default_manager.raw(sql, [at])
+
+    def last_changes(self, objs: Iterable[models.Model]) -> Dict[Any, models.Model]:
+        """
+        Get the last change of each of the given objects with a single query,
+        by primary key. Objects without tracked changes are left out.
+        """
+
+        label = getattr(settings, "AUDIT_LOG_LAST_CHANGE_MODEL", None)
+        if label is None:
+            raise ImproperlyConfigured(
+                "AUDIT_LOG_LAST_CHANGE_MODEL must be set to look up last changes"
+            )
+
+        last_change_model = apps.get_model(label)
+
+        # The object ids can be stored with another type than the primary keys,
+        # like text, so map them back to the primary keys.
+        object_id_field = last_change_model._meta.get_field("object_id")
+        pks = {object_id_field.to_python(obj.pk): obj.pk for obj in objs}
+
+        # pylint: disable=protected-access
+        last_changes = last_change_model._default_manager.filter(
+            content_type=ContentType.objects.get_for_model(self.field.model),
+            object_id__in=list(pks),
+        )
+        return {pks[last_change.object_id]: last_change for last_change in last_changes}
+
+
+class LogObjectForeignKey(GenericForeignKey):
+    """
+    Generic foreign key to the object changed by a log entry. Unlike the
+    GenericForeignKey, this doesn't query the object again when it's known to
+    be missing, as is common for objects that have since been deleted, see
+    models.resolve_log_objects.
+    """
+
+    def __get__(self, instance: Any, cls: Any = None) -> Any:
+        if instance is not None and self.is_cached(instance):
+            if self.get_cached_value(instance) is None:
+                return None
+
+        return super().__get__(instance, cls)
+
+
+def _is_valid_value_policy(policy: Any) -> bool:
+    """
+    Check that a value policy is one of the named policies, or a truncate
+    policy with a length.
+    """
+
+    if isinstance(policy, (tuple, list)):
+        return len(policy) == 2 and policy[0] == "truncate" and policy[1] > 0
+
+    return policy in VALUE_POLICIES
+
+
+def is_audit_logs_field(field: models.Field) -> bool:
+    """
+    Check if a given field is an AuditLogsField
+    """
+
+    return isinstance(field, AuditLogsField)
+
+
+def get_audit_logs_field(model: Type[models.Model]) -> Optional[AuditLogsField]:
+    """
+    Get the model's AuditLogsField, or None if it doesn't have one
+    """
+
+    for field in model._meta.local_fields:
+        if is_audit_logs_field(field):
+            return field
+
+    return None
+
+
+def has_audit_logs_field(model: Type[models.Model]) -> bool:
+    """
+    Check if any of the model's fields is an AuditLogsField
+    """
+
+    return get_audit_logs_field(model) is not None
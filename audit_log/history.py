@@ -0,0 +1,143 @@
+"""
+SQL for the history tables, which keep every version of the rows of models
+audit logged with history enabled.
+"""
+
+from textwrap import dedent
+from typing import List, Type
+
+from django.db import connection
+from django.db.models import Model
+
+from .sql import nest_sql
+
+
+def history_table_name(model: Type[Model]) -> str:
+    """
+    Get the name of the history table of the given model.
+    """
+
+    return f"{ model._meta.db_table }_history"
+
+
+def create_history_table_sql(*, audit_logged_model: Type[Model]) -> List[str]:
+    """
+    Generate the SQL required to create the history table of the given model,
+    if it doesn't exist yet. Every version of a row is kept as a JSON document
+    with the period it was valid in, so changes to the columns of the model
+    don't require changing the history table. Rows without a current version
+    are added with a period starting now, as their earlier versions are
+    unknown.
+    """
+
+    audit_logged_table = audit_logged_model._meta.db_table
+    history_table = history_table_name(audit_logged_model)
+    pk = audit_logged_model._meta.pk
+
+    return [
+        dedent(
+            f"""
+            CREATE TABLE IF NOT EXISTS { history_table } (
+                object_id { pk.rel_db_type(connection) } NOT NULL,
+                valid_period tstzrange NOT NULL,
+                data jsonb NOT NULL
+            )
+            """
+        ),
+        # Used to find the versions valid at a given time
+        dedent(
+            f"""
+            CREATE INDEX IF NOT EXISTS { history_table }_valid_period
+            ON { history_table } USING gist (valid_period)
+            """
+        ),
+        # Used to find the current version of a row from the triggers, and
+        # ensures there is only one
+        dedent(
+            f"""
+            CREATE UNIQUE INDEX IF NOT EXISTS { history_table }_current
+            ON { history_table } (object_id) WHERE upper_inf(valid_period)
+            """
+        ),
+        dedent(
+            f"""
+            INSERT INTO { history_table } (object_id, valid_period, data)
+            SELECT existing.{ pk.column }, tstzrange(now(), NULL), to_jsonb(existing)
+            FROM { audit_logged_table } existing
+            WHERE NOT EXISTS (
+                SELECT FROM { history_table } history
+                WHERE history.object_id = existing.{ pk.column }
+                AND upper_inf(history.valid_period)
+            )
+            """
+        ),
+    ]
+
+
+def drop_history_table_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL required to drop the history table of the given model.
+    """
+
+    return f"DROP TABLE IF EXISTS { history_table_name(audit_logged_model) }"
+
+
+def update_history_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL that keeps the history table of the model up to date. The
+    current version of a changed row is ended now, and the new version is added
+    with a period starting now. A version that started in the same transaction
+    would end up with an empty period, so it's removed instead.
+    """
+
+    history_table = history_table_name(audit_logged_model)
+    pk = audit_logged_model._meta.pk
+
+    def end_versions_sql(condition: str) -> str:
+        return dedent(
+            f"""
+            DELETE FROM { history_table } history
+                WHERE { condition } AND upper_inf(history.valid_period)
+                AND lower(history.valid_period) = now();
+            UPDATE { history_table } history
+                SET valid_period = tstzrange(lower(history.valid_period), now())
+                WHERE { condition } AND upper_inf(history.valid_period);
+            """
+        ).strip()
+
+    end_version_sql = end_versions_sql(f"history.object_id = OLD.{ pk.column }")
+
+    return dedent(
+        f"""
+        IF (TG_OP = 'UPDATE' OR TG_OP = 'DELETE') THEN
+            { nest_sql(end_version_sql, 12) }
+        ELSIF (TG_OP = 'TRUNCATE') THEN
+            { nest_sql(end_versions_sql("TRUE"), 12) }
+        END IF;
+        IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+            INSERT INTO { history_table } (object_id, valid_period, data)
+                VALUES (NEW.{ pk.column }, tstzrange(now(), NULL), to_jsonb(NEW));
+        END IF;
+        """
+    ).strip()
+
+
+def as_of_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL to select the rows of the given model as they were at a
+    given time, from its history table. The time is passed as a query
+    parameter.
+    """
+
+    audit_logged_table = audit_logged_model._meta.db_table
+    history_table = history_table_name(audit_logged_model)
+
+    return dedent(
+        f"""
+        SELECT version.*
+        FROM
+            { history_table } history,
+            jsonb_populate_record(NULL::{ audit_logged_table }, history.data) version
+        WHERE history.valid_period @> %s::timestamptz
+        """
+    ).strip()
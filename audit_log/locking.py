@@ -0,0 +1,95 @@
+"""
+Helpers to execute DDL on busy tables without queueing up behind long running
+transactions.
+"""
+
+import logging
+import time
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from psycopg2 import errorcodes
+
+logger = logging.getLogger(__name__)
+
+
+def execute_with_lock_timeout(
+    *,
+    schema_editor: BaseDatabaseSchemaEditor,
+    sql: Sequence[str],
+    description: str,
+    lock_timeout: Optional[str] = None,
+    retries: Optional[int] = None,
+    retry_delay: Optional[float] = None,
+) -> None:
+    """
+    Execute the SQL to add or remove audit logging for a table, without letting
+    the lock on the table queue up behind long running transactions, which
+    would block all other queries on the table in the meantime.
+
+    The SQL is executed in a single short transaction, or a savepoint when
+    already in a transaction, with the given lock timeout. If the lock isn't
+    acquired in time this is rolled back and retried up to the given number of
+    times, waiting twice as long before every retry. Progress is reported
+    through the audit_log.locking logger. Without a lock timeout the SQL is simply
+    executed.
+
+    The options default to the AUDIT_LOG_LOCK_TIMEOUT, AUDIT_LOG_LOCK_RETRIES
+    and AUDIT_LOG_LOCK_RETRY_DELAY settings.
+    """
+
+    if lock_timeout is None:
+        lock_timeout = getattr(settings, "AUDIT_LOG_LOCK_TIMEOUT", None)
+    if retries is None:
+        retries = getattr(settings, "AUDIT_LOG_LOCK_RETRIES", 0)
+    if retry_delay is None:
+        retry_delay = getattr(settings, "AUDIT_LOG_LOCK_RETRY_DELAY", 1.0)
+
+    if lock_timeout is None or schema_editor.collect_sql:
+        for query in sql:
+            schema_editor.execute(query)
+        return
+
+    schema_connection = schema_editor.connection
+    delay = retry_delay
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic(using=schema_connection.alias):
+                with schema_connection.cursor() as cursor:
+                    # Only change the lock timeout for these statements, even
+                    # when this is part of a larger transaction.
+                    cursor.execute(
+                        "SELECT current_setting('lock_timeout'), "
+                        "set_config('lock_timeout', %s, true)",
+                        [lock_timeout],
+                    )
+                    (previous_lock_timeout, _) = cursor.fetchone()
+
+                for query in sql:
+                    schema_editor.execute(query)
+
+                with schema_connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT set_config('lock_timeout', %s, true)",
+                        [previous_lock_timeout],
+                    )
+        except OperationalError as error:
+            pgcode = getattr(error.__cause__, "pgcode", None)
+            if pgcode != errorcodes.LOCK_NOT_AVAILABLE or attempt == retries:
+                raise
+
+            logger.warning(
+                "Timed out waiting for a lock to %s, retrying in %.1f seconds "
+                "(retry %d of %d)",
+                description,
+                delay,
+                attempt + 1,
+                retries,
+            )
+            time.sleep(delay)
+            delay *= 2
+        else:
+            logger.info("Done: %s", description)
+            return
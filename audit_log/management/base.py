@@ -11,8 +11,13 @@ class AuditLoggedCommand(BaseCommand):
     """
     This sub-class of Django's `BaseCommand` overrides `execute` to add audit
     logging to the command.
+
+    Set summary_logging to run the whole command in summary mode, where
+    changes are logged with one log entry per statement instead of per row.
     """
 
+    summary_logging = False
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
 
         super().__init__(*args, **kwargs)
@@ -31,7 +36,12 @@ class AuditLoggedCommand(BaseCommand):
             ),
             drop_temporary_table_sql=utils.drop_temporary_table_sql(self.context_model),
             create_context=lambda: self.create_context(*args, **kwargs),
+            entry_point="management-command",
         ):
+            if self.summary_logging:
+                with context_managers.summary_logging():
+                    return super().execute(*args, **kwargs)
+
             # Continue as normal
             return super().execute(*args, **kwargs)
 
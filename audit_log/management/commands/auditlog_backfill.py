@@ -0,0 +1,169 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Sequence
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import CommandError, CommandParser
+from django.db import connection, transaction
+from django.db.models import IntegerField
+
+from ... import backfill, context_managers, fields, utils
+from ..base import AuditLoggedCommand
+
+
+class Command(AuditLoggedCommand):
+    """
+    Write a SNAPSHOT log entry with the current values of every existing row of
+    an audit logged model, to have a baseline for the changes logged after
+    audit logging was added to an existing table.
+
+    The rows are processed in batches of primary key ranges, each inserted with
+    a single INSERT ... SELECT and committed separately, so no long running
+    transactions are needed and the rows of the table are never locked. Rows
+    that already have an insert or snapshot logged are skipped, so an
+    interrupted backfill can be resumed by running the command again.
+    """
+
+    help = "Write a snapshot log entry for every existing row of a model"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "model", help="The model to backfill, like app_label.ModelName"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="The size of the primary key range backfilled per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "The number of batches to backfill in parallel, each using its "
+                "own database connection"
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+
+        try:
+            model = apps.get_model(options["model"])
+        except (LookupError, ValueError) as error:
+            raise CommandError(str(error)) from error
+
+        if not fields.has_audit_logs_field(model):
+            raise CommandError(f"{model._meta.label} is not audit logged")
+        if not isinstance(model._meta.pk, IntegerField):
+            raise CommandError("Backfilling requires an integer primary key")
+
+        batch_options = {
+            "sql": backfill.backfill_snapshots_sql(
+                audit_logged_model=model,
+                context_model=self.context_model,
+                log_entry_model=utils.get_logged_to_model(
+                    audit_logged_model=model, default=utils.get_log_entry_model()
+                ),
+            ),
+            "content_type_id": ContentType.objects.get_for_model(model).id,
+            "batch_size": options["batch_size"],
+            "verbosity": options["verbosity"],
+        }
+
+        pk_column = model._meta.pk.column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT min({pk_column}), max({pk_column}) FROM {model._meta.db_table}"
+            )
+            first, last = cursor.fetchone()
+
+        if first is None:
+            self.stdout.write("No rows to backfill")
+            return
+
+        workers = options["workers"]
+        starts = range(first, last + 1, options["batch_size"])
+
+        if workers == 1:
+            # Use the connection of the command, which already has the audit
+            # logging context set up
+            rows = self.backfill(starts, **batch_options)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(
+                        self.backfill_in_thread,
+                        starts[worker::workers],
+                        args=args,
+                        options=options,
+                        batch_options=batch_options,
+                    )
+                    for worker in range(workers)
+                ]
+                rows = sum(future.result() for future in futures)
+
+        self.stdout.write(f"Backfilled {rows} rows of {model._meta.label}")
+
+    def backfill_in_thread(
+        self,
+        starts: Sequence[int],
+        *,
+        args: Sequence[Any],
+        options: Dict[str, Any],
+        batch_options: Dict[str, Any],
+    ) -> int:
+        """
+        Backfill the given batches from a worker thread. Every thread has its own
+        database connection, so the audit logging context is set up for it here.
+        """
+
+        try:
+            with context_managers.audit_logging(
+                create_temporary_table_sql=utils.create_temporary_table_sql(
+                    self.context_model
+                ),
+                drop_temporary_table_sql=utils.drop_temporary_table_sql(
+                    self.context_model
+                ),
+                create_context=lambda: self.create_context(*args, **options),
+                entry_point="management-command",
+            ):
+                return self.backfill(starts, **batch_options)
+        finally:
+            connection.close()
+
+    def backfill(
+        self,
+        starts: Sequence[int],
+        *,
+        sql: str,
+        content_type_id: int,
+        batch_size: int,
+        verbosity: int,
+    ) -> int:
+        """
+        Backfill the batches of primary keys starting at the given values, and
+        return the number of rows backfilled.
+        """
+
+        rows = 0
+        for start in starts:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    sql,
+                    {
+                        "content_type_id": content_type_id,
+                        "start": start,
+                        "end": start + batch_size,
+                    },
+                )
+                rows += cursor.rowcount
+
+            if verbosity >= 2:
+                self.stdout.write(
+                    f"Backfilled {cursor.rowcount} rows with primary keys "
+                    f"from {start} to {start + batch_size - 1}"
+                )
+
+        return rows
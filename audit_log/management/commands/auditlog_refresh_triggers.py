@@ -0,0 +1,57 @@
+from typing import Any
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ... import utils
+
+
+class Command(BaseCommand):
+    """
+    Replace the trigger functions of all audit logged models. The SQL of the
+    trigger functions depends on settings like AUDIT_LOG_LAST_CHANGE_MODEL and
+    AUDIT_LOG_ROLLUP_MODEL when they are created, so this has to be run after
+    changing those for models that are already audit logged.
+
+    Models are found by their trigger function, so models audit logged with
+    the migration operations instead of an AuditLogsField are included, and
+    models that are not migrated yet are skipped. All functions are replaced
+    in a single transaction.
+    """
+
+    help = "Replace the audit logging trigger functions of all audited models"
+
+    def handle(self, *args: Any, **options: Any) -> None:
+
+        context_model = utils.get_context_model()
+        log_entry_model = utils.get_log_entry_model()
+
+        refreshed = 0
+        with connection.schema_editor() as schema_editor:
+            for model in apps.get_models():
+                # Proxy models share the table of their concrete model
+                if model._meta.proxy:
+                    continue
+
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT to_regprocedure(%s)",
+                        [f"{model._meta.db_table}_log_change()"],
+                    )
+                    (function,) = cursor.fetchone()
+
+                if function is None:
+                    if options["verbosity"] >= 2:
+                        self.stdout.write(f"Skipped {model._meta.label}")
+                    continue
+
+                for query in utils.refresh_audit_logging_sql(
+                    audit_logged_model=model,
+                    context_model=context_model,
+                    log_entry_model=log_entry_model,
+                ):
+                    schema_editor.execute(query)
+                refreshed += 1
+
+        self.stdout.write(f"Refreshed the trigger functions of {refreshed} models")
@@ -0,0 +1,125 @@
+from typing import Any, List
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import DatabaseError, connection, transaction
+
+from ... import fields, utils
+
+FUNCTION_STATS_SQL = r"""
+SELECT
+    left(f.funcname, -length('_log_change')) AS table_name,
+    f.calls,
+    f.total_time,
+    f.self_time,
+    t.n_live_tup
+FROM pg_stat_user_functions f
+LEFT JOIN pg_stat_user_tables t
+    ON t.schemaname = f.schemaname
+    AND t.relname = left(f.funcname, -length('_log_change'))
+WHERE f.funcname LIKE '%\_log\_change'
+ORDER BY f.total_time DESC
+"""
+
+TABLE_STATS_SQL = """
+SELECT relname, n_live_tup, pg_total_relation_size(relid)
+FROM pg_stat_user_tables
+WHERE relname = ANY(%s)
+ORDER BY relname
+"""
+
+
+class Command(BaseCommand):
+    """
+    Report how much time is spent in the audit logging trigger functions, based
+    on the statistics PostgreSQL collects in pg_stat_user_functions, along with
+    the size of the log entry tables.
+    """
+
+    help = "Show statistics for the audit logging triggers"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--enable-tracking",
+            action="store_true",
+            help=(
+                "Enable tracking of function calls for new sessions on this "
+                "database. Requires superuser privileges."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+
+        if options["enable_tracking"]:
+            self.enable_tracking()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW track_functions")
+            (track_functions,) = cursor.fetchone()
+
+            if track_functions == "none":
+                self.stderr.write(
+                    "Function call tracking is disabled (track_functions = none), "
+                    "so trigger statistics are not being collected. Use "
+                    "--enable-tracking or set track_functions = 'pl' in the "
+                    "server configuration."
+                )
+
+            cursor.execute(FUNCTION_STATS_SQL)
+            function_stats = cursor.fetchall()
+
+            cursor.execute(TABLE_STATS_SQL, [self.get_log_entry_tables()])
+            table_stats = cursor.fetchall()
+
+        self.stdout.write(
+            f"{'Table':<40} {'Calls':>12} {'Total ms':>12} {'Self ms':>12} "
+            f"{'Avg ms':>8} {'Rows':>12}"
+        )
+        for table_name, calls, total_time, self_time, rows in function_stats:
+            average = total_time / calls if calls else 0
+            self.stdout.write(
+                f"{table_name:<40} {calls:>12} {total_time:>12.1f} "
+                f"{self_time:>12.1f} {average:>8.3f} {rows or 0:>12}"
+            )
+
+        if table_stats:
+            self.stdout.write("")
+        for log_entry_table, rows, size in table_stats:
+            self.stdout.write(
+                f"Log entry table {log_entry_table}: "
+                f"~{rows} rows, {size / 1024 / 1024:.1f} MB"
+            )
+
+    def get_log_entry_tables(self) -> List[str]:
+        """
+        Get the tables of the default log entry model and the log entry models
+        the audit logged models are logged to.
+        """
+
+        log_entry_models = {utils.get_log_entry_model()}
+        for model in apps.get_models():
+            field = fields.get_audit_logs_field(model)
+            if field is not None:
+                log_entry_models.add(field.remote_field.model)
+
+        return sorted(model._meta.db_table for model in log_entry_models)
+
+    def enable_tracking(self) -> None:
+        """
+        Enable function call tracking for new sessions on the current database.
+        This is not possible for the current session only, as the triggers are
+        executed by other sessions.
+        """
+
+        database_name = connection.ops.quote_name(connection.settings_dict["NAME"])
+
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"ALTER DATABASE {database_name} SET track_functions = 'pl'"
+                    )
+        except DatabaseError as error:
+            self.stderr.write(f"Unable to enable function call tracking: {error}")
+        else:
+            self.stdout.write("Enabled function call tracking for new sessions")
@@ -38,6 +38,7 @@ class AuditLoggingMiddleware:
             create_temporary_table_sql=self.create_temporary_table_sql,
             drop_temporary_table_sql=self.drop_temporary_table_sql,
             create_context=lambda: self.create_context(request),
+            entry_point="middleware",
         ):
             return self.get_response(request)
 
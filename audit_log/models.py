@@ -1,12 +1,29 @@
 from __future__ import annotations
 
-from typing import Any, Mapping, Tuple, Type, cast
+from collections import defaultdict
+from datetime import date
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    cast,
+)
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
-from django.db import models
+from django.db import connections, models
+from django.db.models import Sum
+from django.db.models.fields.json import KeyTransform
+from django.db.models.functions import Trunc
 from django.http import HttpRequest
 
 from . import fields
@@ -17,6 +34,7 @@ CONTEXT_TYPE_CHOICES = getattr(
     (
         ("HTTP request", "http-request"),
         ("Management command", "management-command"),
+        ("Celery task", "celery-task"),
     ),
 )
 
@@ -94,18 +112,106 @@ class BaseContext(models.Model):
             ),
         )
 
+    @classmethod
+    def create_from_task(cls, *, task: Any) -> BaseContext:
+        """
+        Insert audit logging context data when a Celery task is run.
+        """
+
+        return cast(
+            BaseContext,
+            cls.objects.create(
+                context_type="celery-task",
+                context={
+                    "task": task.name,
+                    "id": task.request.id,
+                    "retries": task.request.retries,
+                },
+            ),
+        )
+
+
+class LogEntryQuerySet(models.QuerySet):
+    """
+    Query set for audit log entries, with lookups on the logged changes. These
+    only use operators supported by a GIN index on the changes, see the README.
+    """
+
+    def for_objects(
+        self, objects: Iterable[Tuple[Type[models.Model], Iterable[Any]]]
+    ) -> LogEntryQuerySet:
+        """
+        Get a timeline of the log entries of several objects, like an order and
+        its lines, newest first. The objects are given as pairs of a model and
+        the ids of its objects, which can also be a query set of ids, like
+        order.lines.values("id"). This is a single query using the index on
+        the content type and object id.
+        """
+
+        condition = models.Q()
+        for model, ids in objects:
+            condition |= models.Q(
+                content_type=ContentType.objects.get_for_model(model),
+                object_id__in=ids,
+            )
+
+        # Without any objects the condition would match everything
+        if not condition:
+            return self.none()
+
+        return self.filter(condition).order_by("-at", "-pk")
+
+    def before(self, entry: BaseLogEntry) -> LogEntryQuerySet:
+        """
+        Get the log entries before the given one in a timeline, to get the next
+        page of entries. This uses the position of the entry instead of an
+        offset, so every page is as cheap as the first one.
+        """
+
+        return self.filter(
+            models.Q(at__lt=entry.at) | models.Q(at=entry.at, pk__lt=entry.pk)
+        )
+
+    def changed_field(self, field: str) -> LogEntryQuerySet:
+        """
+        Get the log entries of updates that changed the given column.
+        """
+
+        return self.filter(action="UPDATE", changes__has_key=field)
+
+    def changed_to(self, field: str, value: Any) -> LogEntryQuerySet:
+        """
+        Get the log entries of updates that changed the given column to the
+        given value. The containment check can use the index, but also matches
+        changes from the value, so the new value is checked as well.
+        """
+
+        return self.alias(
+            new_value=KeyTransform("1", KeyTransform(field, "changes"))
+        ).filter(
+            action="UPDATE",
+            changes__contains={field: [value]},
+            new_value=value,
+        )
+
 
 class BaseLogEntry(models.Model):
     """
     Base class for audit log entries
     """
 
+    objects = LogEntryQuerySet.as_manager()
+
     # We use a generic foreign key fron Django's contenttypes framework to
     # identify the object that was changed.
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField(null=True)
 
-    log_object = GenericForeignKey("content_type", "object_id")
+    log_object = fields.LogObjectForeignKey("content_type", "object_id")
+
+    # Whether the object was found to be deleted, when the log objects are
+    # fetched with resolve_log_objects, and None otherwise.
+    log_object_deleted: Optional[bool] = None
 
     # Track the user that performed the action.
     performed_by = models.ForeignKey(
@@ -122,8 +228,14 @@ class BaseLogEntry(models.Model):
 
     # The action that was performed.
     action = models.CharField(
-        max_length=6,
-        choices=(("Insert", "INSERT"), ("Update", "UPDATE"), ("Delete", "DELETE")),
+        max_length=8,
+        choices=(
+            ("Insert", "INSERT"),
+            ("Update", "UPDATE"),
+            ("Delete", "DELETE"),
+            ("Truncate", "TRUNCATE"),
+            ("Snapshot", "SNAPSHOT"),
+        ),
     )
 
     # The time the action was made
@@ -134,6 +246,222 @@ class BaseLogEntry(models.Model):
 
     class Meta:
         abstract = True
+        indexes = [
+            # Used to look up the log entries of an object, both through the
+            # AuditLogsField and from the triggers.
+            models.Index(fields=["content_type", "object_id"]),
+        ]
+
+
+class BaseLastChange(models.Model):
+    """
+    Base class for keeping track of the last change of each audit logged
+    object, when the AUDIT_LOG_LAST_CHANGE_MODEL setting is set. The rows are
+    kept up to date by the audit logging triggers, so the last change of an
+    object can be looked up without going through all its log entries.
+    """
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+
+    log_object = GenericForeignKey("content_type", "object_id")
+
+    # The last action that was performed on the object. Objects are removed
+    # when they are deleted, so this is either an insert or an update.
+    action = models.CharField(
+        max_length=8,
+        choices=(
+            ("Insert", "INSERT"),
+            ("Update", "UPDATE"),
+        ),
+    )
+
+    # The time of the last change
+    at = models.DateTimeField()
+
+    # The user that made the last change
+    performed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True
+    )
+
+    class Meta:
+        abstract = True
+        constraints = [
+            # The triggers upsert the rows using this constraint, so it must
+            # exist under this name.
+            models.UniqueConstraint(
+                fields=["content_type", "object_id"],
+                name="%(app_label)s_%(class)s_object",
+            ),
+        ]
+
+
+class ChangeRollupQuerySet(models.QuerySet):
+    """
+    Query set for change rollups. The triggers add a row for every change, so
+    a day can have many rows for the same model, user and action, and the
+    counts should always be summed, like counts() does. Use compact() to merge
+    them.
+    """
+
+    def for_model(self, model: Type[models.Model]) -> ChangeRollupQuerySet:
+        """
+        Get the counts of changes to the given model.
+        """
+
+        return self.filter(content_type=ContentType.objects.get_for_model(model))
+
+    def between(self, start: date, end: date) -> ChangeRollupQuerySet:
+        """
+        Get the counts of changes between the given days, inclusive.
+        """
+
+        return self.filter(day__gte=start, day__lte=end)
+
+    def counts(
+        self, *field_names: str, period: Optional[str] = None
+    ) -> models.QuerySet:
+        """
+        Get the number of changes grouped by the given fields, like
+        "content_type", "performed_by" and "action", as dictionaries with the
+        number in "changes". With a period, one of "day", "week", "month" or
+        "year", the counts are also grouped by the start of the period, in
+        "period".
+        """
+
+        queryset: models.QuerySet = self
+        if period is not None:
+            queryset = queryset.annotate(
+                period=Trunc("day", period, output_field=models.DateField())
+            )
+            field_names = ("period", *field_names)
+
+        return (
+            queryset.values(*field_names)
+            .annotate(changes=Sum("count"))
+            .order_by(*field_names)
+        )
+
+    def compact(self) -> None:
+        """
+        Merge the rows in the query set with the same day, model, user and
+        action into a single row with the sum of their counts. This is done in
+        a single statement, and rows added by concurrent transactions are left
+        alone, so it's safe to run while changes are being counted, for example
+        nightly for the previous day.
+        """
+
+        table_name = self.model._meta.db_table
+        pk_column = self.model._meta.pk.column
+        columns = "day, content_type_id, performed_by_id, action"
+        query, params = self.values("pk").query.sql_with_params()
+
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH deleted AS (
+                    DELETE FROM { table_name } WHERE { pk_column } IN ({ query })
+                    RETURNING { columns }, count
+                )
+                INSERT INTO { table_name } ({ columns }, count)
+                SELECT { columns }, sum(count) FROM deleted GROUP BY { columns }
+                """,
+                params,
+            )
+
+
+class BaseChangeRollup(models.Model):
+    """
+    Base class for counting the changes to audit logged models per day, when
+    the AUDIT_LOG_ROLLUP_MODEL setting is set. The counts are kept up to date
+    by the audit logging triggers, so dashboards can query them without going
+    through the log entries.
+    """
+
+    # The day of the changes, in UTC
+    day = models.DateField()
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+
+    # The user that performed the changes
+    performed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True
+    )
+
+    action = models.CharField(
+        max_length=8,
+        choices=(
+            ("Insert", "INSERT"),
+            ("Update", "UPDATE"),
+            ("Delete", "DELETE"),
+            ("Truncate", "TRUNCATE"),
+        ),
+    )
+
+    # The number of changed rows, or truncates
+    count = models.BigIntegerField()
+
+    objects = ChangeRollupQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+        indexes = [
+            # Used to query the counts of a model
+            models.Index(fields=["content_type", "day", "action"]),
+        ]
+
+
+LogEntry = TypeVar("LogEntry", bound=BaseLogEntry)
+
+
+def resolve_log_objects(entries: Iterable[LogEntry]) -> List[LogEntry]:
+    """
+    Fetch the objects changed by the given log entries with a single query per
+    content type, and attach them to the entries, so accessing log_object
+    doesn't query the database for each entry. Entries of objects that no
+    longer exist get None, and are marked with log_object_deleted. The entries
+    are returned as a list.
+    """
+
+    entries = list(entries)
+
+    ids_by_content_type: Dict[int, Set[Any]] = defaultdict(set)
+    for entry in entries:
+        if entry.object_id is not None:
+            ids_by_content_type[entry.content_type_id].add(entry.object_id)
+
+    # The objects are keyed by the object ids as stored in the log entries,
+    # which can have another type than the primary keys, like text.
+    objects_by_content_type: Dict[int, Mapping[Any, Optional[models.Model]]] = {}
+    for content_type_id, ids in ids_by_content_type.items():
+        # Content types are cached, so this only queries unknown ones
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is None:
+            objects_by_content_type[content_type_id] = {}
+            continue
+
+        # Use the base manager, so objects hidden by the default manager are
+        # still found
+        # pylint: disable=protected-access
+        pk = model._meta.pk
+        objects = model._base_manager.in_bulk(
+            [pk.to_python(object_id) for object_id in ids]
+        )
+        objects_by_content_type[content_type_id] = {
+            object_id: objects.get(pk.to_python(object_id)) for object_id in ids
+        }
+
+    for entry in entries:
+        log_object = None
+        if entry.object_id is not None:
+            log_object = objects_by_content_type[entry.content_type_id].get(
+                entry.object_id
+            )
+
+        entry.log_object_deleted = entry.object_id is not None and log_object is None
+        entry._meta.get_field("log_object").set_cached_value(entry, log_object)
+
+    return entries
 
 
 class AuditLoggedModel(models.Model):
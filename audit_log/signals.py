@@ -0,0 +1,19 @@
+"""
+Signals sent by the audit logging machinery. These are mostly useful for
+instrumentation, like tracking how much time is spent setting up audit logging
+context for each request.
+"""
+
+from django.dispatch import Signal
+
+# Sent after each step of setting up or tearing down audit logging context. The
+# sender is the entry point that set up the context, like "middleware",
+# "management-command" or "celery-task", and receivers get the following
+# arguments:
+#
+#  - step: The step that was performed, one of "create_table", "create_context",
+#    "drop_table", "clear_context" (when the table is kept for reuse) and
+#    "restore_context" (when leaving a nested context).
+#  - duration: The time spent on the step, in seconds.
+#  - statements: The number of SQL statements executed during the step.
+audit_logging_step = Signal()
@@ -0,0 +1,72 @@
+"""
+Helpers shared by the SQL of the trigger functions and the backfill.
+"""
+
+from textwrap import dedent
+from typing import Any, Type
+
+from django.db import connection
+from django.db.models import AutoField, Field, Model
+from psycopg2.extensions import adapt
+
+
+def nest_sql(sql: str, width: int) -> str:
+    """
+    Prepare a multiline SQL snippet for inclusion in another multiline SQL
+    string, at a placeholder indented by the given width. The first line is
+    indented by the placeholder itself, so only the following lines are
+    indented here. This keeps dedent working on the combined string. Empty
+    snippets are left out.
+    """
+
+    if not sql.strip():
+        return ""
+
+    first_line, *lines = dedent(sql).strip().splitlines()
+    return "\n".join(
+        [first_line, *(" " * width + line if line else line for line in lines)]
+    )
+
+
+def quote_value(value: Any) -> str:
+    """
+    Quote a value for inclusion in DDL, where we can't use query parameters.
+    The DDL is executed with query parameters, so percent signs are escaped.
+    """
+
+    adapted = adapt(value)
+    if hasattr(adapted, "encoding"):
+        adapted.encoding = "utf8"
+    return adapted.getquoted().decode().replace("%", "%%")
+
+
+def object_id_sql(
+    *, audit_logged_model: Type[Model], model: Type[Model], row: str
+) -> str:
+    """
+    Generate the SQL expression for the object id of the given row variable in
+    the trigger (NEW or OLD), as stored in the object_id column of the given
+    model, like the log entry model. The primary key is cast if its type
+    differs from the type of the column, so the column can be e.g. a bigint,
+    uuid or text column. Casting this side keeps lookups on the column indexed.
+    """
+
+    pk = audit_logged_model._meta.pk
+    object_id_type = model._meta.get_field("object_id").db_type(connection)
+    if pk.rel_db_type(connection) == object_id_type:
+        return f"{ row }.{ pk.column }"
+
+    return f"{ row }.{ pk.column }::{ object_id_type }"
+
+
+def context_columns_sql(context_model: Type[Model]) -> str:
+    """
+    Get the columns of the context model that are copied to log entries, as a
+    comma separated list.
+    """
+
+    return ", ".join(
+        field.column
+        for field in context_model._meta.get_fields()  # noqa
+        if isinstance(field, Field) and not isinstance(field, AutoField)
+    )
@@ -0,0 +1,104 @@
+"""
+Helpers to tune how log entry tables are stored.
+"""
+
+from textwrap import dedent
+from typing import Any, List, Mapping, Optional, Sequence, Type
+
+from django.db.models import AutoField, Model
+
+
+def alter_storage_sql(
+    *,
+    model: Type[Model],
+    field_names: Sequence[str],
+    compression: Optional[str],
+    storage_parameters: Mapping[str, Any],
+    sequence_cache: Optional[int] = None,
+) -> List[str]:
+    """
+    Generate the SQL required to set the compression method of the given fields
+    and the storage parameters of the table for the given model, and the number
+    of ids each database session preallocates from the id sequence.
+    """
+
+    table_name = model._meta.db_table
+    sql = []
+
+    if compression:
+        for field_name in field_names:
+            column = model._meta.get_field(field_name).column
+            sql.append(
+                f"ALTER TABLE { table_name } "
+                f"ALTER COLUMN { column } SET COMPRESSION { compression }"
+            )
+
+    if storage_parameters:
+        parameters = ", ".join(
+            f"{ name } = { value }" for name, value in storage_parameters.items()
+        )
+        sql.append(f"ALTER TABLE { table_name } SET ({ parameters })")
+
+    if sequence_cache:
+        sql.append(_alter_sequence_cache_sql(model=model, cache=sequence_cache))
+
+    return sql
+
+
+def reset_storage_sql(
+    *,
+    model: Type[Model],
+    field_names: Sequence[str],
+    compression: Optional[str],
+    storage_parameters: Mapping[str, Any],
+    sequence_cache: Optional[int] = None,
+) -> List[str]:
+    """
+    Generate the SQL required to reset the compression method of the given
+    fields, the given storage parameters and the sequence cache to the
+    defaults.
+    """
+
+    table_name = model._meta.db_table
+    sql = []
+
+    if compression:
+        for field_name in field_names:
+            column = model._meta.get_field(field_name).column
+            sql.append(
+                f"ALTER TABLE { table_name } "
+                f"ALTER COLUMN { column } SET COMPRESSION default"
+            )
+
+    if storage_parameters:
+        parameters = ", ".join(storage_parameters)
+        sql.append(f"ALTER TABLE { table_name } RESET ({ parameters })")
+
+    if sequence_cache:
+        sql.append(_alter_sequence_cache_sql(model=model, cache=1))
+
+    return sql
+
+
+def _alter_sequence_cache_sql(*, model: Type[Model], cache: int) -> str:
+    """
+    Generate the SQL required to change the cache size of the sequence of the
+    id of the given model. The name of the sequence is looked up by the
+    database, as it depends on how the table was created.
+    """
+
+    pk = model._meta.pk
+    if not isinstance(pk, AutoField):
+        raise ValueError(f"{ model.__name__ } doesn't have a sequence generated id")
+
+    return dedent(
+        f"""
+        DO $$
+        BEGIN
+            EXECUTE 'ALTER SEQUENCE '
+                || pg_get_serial_sequence('{ model._meta.db_table }', '{ pk.column }')
+                || ' CACHE { int(cache) }';
+        END
+        $$
+        """
+    )
@@ -0,0 +1,869 @@
+"""
+SQL for the audit logging triggers and their trigger functions.
+"""
+
+from textwrap import dedent
+from typing import Optional, Sequence, Type
+
+from django.db import connection
+from django.db.models import IntegerField, Model, UUIDField
+from django.db.models.sql import Query
+
+from .changes import (
+    json_diff_columns_sql,
+    non_default_changes_sql,
+    pk_only_changes_sql,
+    row_sql,
+    update_changes_sql,
+)
+from .fields import get_audit_logs_field
+from .history import update_history_sql
+from .sql import context_columns_sql, nest_sql, object_id_sql, quote_value
+
+# Whether summary mode is enabled for the current session, see
+# context_managers.summary_logging.
+SUMMARY_MODE_SQL = (
+    "COALESCE(current_setting('audit_log.summary_mode', true), '') = 'on'"
+)
+
+
+def create_trigger_function_sql(
+    *,
+    audit_logged_model: Type[Model],
+    context_model: Type[Model],
+    log_entry_model: Type[Model],
+    last_change_model: Optional[Type[Model]] = None,
+    rollup_model: Optional[Type[Model]] = None,
+) -> str:
+    """
+    Generate the SQL to create the function to log the SQL, or replace it if
+    it exists. If a last change model is given, the function also keeps the
+    last change of each object up to date, and if a rollup model is given, it
+    counts the changes per day.
+    """
+
+    audit_logs_field = get_audit_logs_field(audit_logged_model)
+    context_table_name = context_model._meta.db_table  # noqa
+
+    summary_sql = ""
+    if audit_logs_field is not None and audit_logs_field.allow_summary_logging:
+        summary_sql = _summary_sql(
+            audit_logged_model=audit_logged_model,
+            insert_sql="\n".join(
+                [
+                    _insert_log_entry_sql(
+                        context_model=context_model,
+                        log_entry_model=log_entry_model,
+                        changes="summary",
+                        object_id="NULL",
+                    ),
+                    _rollup_sql(
+                        rollup_model=rollup_model, count="(summary->>'rows')::bigint"
+                    ),
+                ]
+            ),
+        )
+
+    last_change_sql = ""
+    if last_change_model is not None:
+        last_change_sql = _last_change_sql(
+            audit_logged_model=audit_logged_model, last_change_model=last_change_model
+        )
+
+    history_sql = ""
+    if audit_logs_field is not None and audit_logs_field.history:
+        history_sql = update_history_sql(audit_logged_model=audit_logged_model)
+
+    log_change_sql = _log_change_sql(
+        audit_logged_model=audit_logged_model,
+        context_model=context_model,
+        log_entry_model=log_entry_model,
+    )
+
+    return dedent(
+        f"""
+        CREATE OR REPLACE FUNCTION { audit_logged_model._meta.db_table }_log_change()
+        RETURNS TRIGGER AS $$
+        -- Let the variables below take precedence over columns with the same
+        -- name, so we can refer to both in the same query
+        #variable_conflict use_variable
+        DECLARE
+            -- Id of the inserted row, used to ensure exactly one row is inserted
+            entry_id { _entry_id_type(log_entry_model) };
+            content_type_id int;
+            -- Number of rows removed by a truncate, if it's counted
+            row_count bigint;
+            -- Summary of the rows changed by a statement, in summary mode
+            summary jsonb;
+            -- The context the change was made in
+            context_row record;
+            has_context boolean := false;
+            fallback_context text;
+        BEGIN
+            SELECT id INTO STRICT content_type_id
+                FROM django_content_type WHERE
+                app_label = '{ audit_logged_model._meta.app_label }'
+                AND model = '{ audit_logged_model._meta.model_name }';
+
+            -- We rely on the context table being created by our Django
+            -- middleware, or other code that sets up audit logging context.
+            -- Without it, or when it's empty, use the fallback context if one
+            -- is set.
+            IF to_regclass('pg_temp.{ context_table_name }') IS NOT NULL THEN
+                SELECT * INTO context_row FROM { context_table_name };
+                has_context := FOUND;
+            END IF;
+            IF NOT has_context THEN
+                fallback_context := current_setting('audit_log.fallback_context', true);
+                IF COALESCE(fallback_context, '') = '' THEN
+                    RAISE EXCEPTION USING
+                        MESSAGE = 'No audit logging context for ' || TG_TABLE_NAME,
+                        HINT = 'Set up audit logging context or a fallback context';
+                END IF;
+                SELECT * INTO STRICT context_row FROM jsonb_populate_record(
+                    NULL::{ log_entry_model._meta.db_table }, fallback_context::jsonb
+                );
+            END IF;
+
+            { nest_sql(summary_sql, 12) }
+
+            { nest_sql(last_change_sql, 12) }
+
+            { nest_sql(history_sql, 12) }
+
+            { nest_sql(_rollup_sql(rollup_model=rollup_model, count="1"), 12) }
+
+            { nest_sql(log_change_sql, 12) }
+        END;
+        $$ language 'plpgsql';
+        """
+    )
+
+
+def _insert_log_entry_sql(
+    *,
+    context_model: Type[Model],
+    log_entry_model: Type[Model],
+    changes: str,
+    object_id: str,
+) -> str:
+    """
+    Generate the SQL that inserts a log entry with the given changes and object
+    id, and the context of the change. Log entry models with UUID ids get time
+    ordered ids generated here.
+    """
+
+    context_fields = context_columns_sql(context_model)
+    context_values = ", ".join(
+        f"context_row.{ column.strip() }" for column in context_fields.split(",")
+    )
+
+    log_entry_pk = log_entry_model._meta.pk
+    id_column, id_value = "", ""
+    if generates_log_entry_ids(log_entry_model):
+        id_column, id_value = f"{ log_entry_pk.column }, ", "audit_log_uuid_v7(), "
+
+    return dedent(
+        f"""
+        INSERT INTO { log_entry_model._meta.db_table } AS entry (
+            { id_column }{ context_fields },
+            action,
+            at,
+            changes,
+            content_type_id,
+            object_id
+        ) VALUES (
+            { id_value }{ context_values },
+            TG_OP,
+            now(),
+            { nest_sql(changes, 12) },
+            content_type_id,
+            { object_id }
+        )
+        -- We return the id into the variable to make postgresql check
+        -- that exactly one row is inserted. The column is qualified, as it
+        -- could otherwise refer to the variable.
+        RETURNING entry.{ log_entry_pk.column } INTO STRICT entry_id;
+        """
+    ).strip()
+
+
+def _entry_id_type(log_entry_model: Type[Model]) -> str:
+    """
+    Get the type of the entry_id variable of the trigger function. Ids that
+    aren't generated by the trigger function are handled as bigint, so the ids
+    of log entry models can be changed to bigint without recreating the
+    triggers.
+    """
+
+    return "uuid" if generates_log_entry_ids(log_entry_model) else "bigint"
+
+
+def _insert_changes_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL expression for the changes logged for an insert.
+    """
+
+    audit_logs_field = get_audit_logs_field(audit_logged_model)
+    if audit_logs_field is not None and audit_logs_field.insert_payload != "full":
+        return non_default_changes_sql(audit_logged_model=audit_logged_model)
+
+    return row_sql(audit_logged_model=audit_logged_model, row="NEW")
+
+
+def _log_change_sql(
+    *,
+    audit_logged_model: Type[Model],
+    context_model: Type[Model],
+    log_entry_model: Type[Model],
+) -> str:
+    """
+    Generate the SQL that logs the change that invoked a row level trigger, or
+    a truncate.
+    """
+
+    audit_logs_field = get_audit_logs_field(audit_logged_model)
+
+    # The object id is cast to the type of the object_id column, if needed
+    new_object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=log_entry_model, row="NEW"
+    )
+    old_object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=log_entry_model, row="OLD"
+    )
+
+    def insert_log_entry_sql(*, changes: str, object_id: str) -> str:
+        return _insert_log_entry_sql(
+            context_model=context_model,
+            log_entry_model=log_entry_model,
+            changes=changes,
+            object_id=object_id,
+        )
+
+    insert_sql = insert_log_entry_sql(
+        changes=_insert_changes_sql(audit_logged_model=audit_logged_model),
+        object_id=new_object_id,
+    )
+    update_sql = insert_log_entry_sql(
+        changes=update_changes_sql(audit_logged_model=audit_logged_model),
+        object_id=new_object_id,
+    )
+    if audit_logs_field is not None and audit_logs_field.coalesce_changes:
+        insert_sql = _remember_entry_sql(insert_sql=insert_sql, object_id=new_object_id)
+        update_sql = _coalesce_update_sql(
+            audit_logged_model=audit_logged_model,
+            log_entry_model=log_entry_model,
+            update_sql=_remember_entry_sql(
+                insert_sql=update_sql, object_id=new_object_id
+            ),
+        )
+
+    delete_changes = row_sql(audit_logged_model=audit_logged_model, row="OLD")
+    if audit_logs_field is not None and audit_logs_field.delete_payload != "full":
+        delete_changes = pk_only_changes_sql(
+            audit_logged_model=audit_logged_model,
+            log_entry_table_name=log_entry_model._meta.db_table,
+            object_id=old_object_id,
+        )
+    delete_sql = insert_log_entry_sql(changes=delete_changes, object_id=old_object_id)
+
+    truncate_sql = insert_log_entry_sql(changes="'{}'::jsonb", object_id="NULL")
+    if audit_logs_field is not None and audit_logs_field.truncate_row_count:
+        # The trigger runs before the table is truncated, so we can still
+        # count the rows
+        truncate_sql = "\n".join(
+            [
+                "SELECT count(*) INTO row_count "
+                f"FROM { audit_logged_model._meta.db_table };",
+                insert_log_entry_sql(
+                    changes="jsonb_build_object('rows', row_count)", object_id="NULL"
+                ),
+            ]
+        )
+
+    return dedent(
+        f"""
+        IF (TG_OP = 'INSERT') THEN
+            { nest_sql(insert_sql, 12) }
+            RETURN NEW;
+        ELSIF (TG_OP = 'UPDATE') THEN
+            { nest_sql(update_sql, 12) }
+            RETURN NEW;
+        ELSIF (TG_OP = 'DELETE') THEN
+            { nest_sql(delete_sql, 12) }
+            RETURN NEW;
+        ELSIF (TG_OP = 'TRUNCATE') THEN
+            -- Truncates are logged once per statement, without an object
+            { nest_sql(truncate_sql, 12) }
+            RETURN NULL;
+        END IF;
+        """
+    ).strip()
+
+
+def generates_log_entry_ids(log_entry_model: Type[Model]) -> bool:
+    """
+    Check if the ids of the given log entry model are generated by the
+    triggers, which is the case for UUID ids.
+    """
+
+    return isinstance(log_entry_model._meta.pk, UUIDField)
+
+
+def create_uuid_v7_function_sql() -> str:
+    """
+    Generate the SQL to create the function that generates the ids of log
+    entry models with UUID ids. These are time ordered UUIDv7 ids, so new log
+    entries are added at the end of the primary key index, like with sequence
+    generated ids, without a sequence shared by all writers. The function is
+    shared by all log entry models, so it's never dropped.
+
+    The random bits are taken from md5 instead of gen_random_uuid, which is
+    only built in from PostgreSQL 13. They only need to be unique, not
+    unpredictable.
+    """
+
+    return dedent(
+        """
+        CREATE OR REPLACE FUNCTION audit_log_uuid_v7()
+        RETURNS uuid AS $$
+        DECLARE
+            value bytea;
+        BEGIN
+            value := decode(md5(random()::text || clock_timestamp()::text), 'hex');
+            -- The first 48 bits are the Unix time in milliseconds
+            value := overlay(
+                value
+                PLACING substring(
+                    int8send(
+                        floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint
+                    )
+                    FROM 3
+                )
+                FROM 1 FOR 6
+            );
+            -- Set the version to 7 and the variant to RFC 4122
+            value := set_byte(value, 6, (get_byte(value, 6) & 15) | 112);
+            value := set_byte(value, 8, (get_byte(value, 8) & 63) | 128);
+            RETURN encode(value, 'hex')::uuid;
+        END;
+        $$ LANGUAGE plpgsql VOLATILE
+        """
+    )
+
+
+def _summary_sql(*, audit_logged_model: Type[Model], insert_sql: str) -> str:
+    """
+    Generate the SQL that logs a single summary entry for all rows changed by
+    a statement, when the trigger function is invoked by one of the statement
+    level summary triggers. The rows are read from the transition tables.
+    """
+
+    pk = audit_logged_model._meta.pk
+    new_condition = condition_sql(audit_logged_model=audit_logged_model, row="new_rows")
+    old_condition = condition_sql(audit_logged_model=audit_logged_model, row="old_rows")
+
+    inserted_sql = f"SELECT new_rows.{ pk.column } AS id FROM new_rows"
+    if new_condition:
+        inserted_sql += f" WHERE { new_condition }"
+
+    deleted_sql = f"SELECT old_rows.{ pk.column } AS id FROM old_rows"
+    if old_condition:
+        deleted_sql += f" WHERE { old_condition }"
+
+    updated_join_sql = dedent(
+        f"""
+        old_rows JOIN new_rows ON old_rows.{ pk.column } = new_rows.{ pk.column }
+        """
+    ).strip()
+    updated_condition = "old_rows.* IS DISTINCT FROM new_rows.*"
+    if old_condition and new_condition:
+        updated_condition += f" AND (({ old_condition }) OR ({ new_condition }))"
+    updated_sql = dedent(
+        f"""
+        SELECT new_rows.{ pk.column } AS id
+        FROM { updated_join_sql }
+        WHERE { updated_condition }
+        """
+    ).strip()
+
+    columns_sql = dedent(
+        f"""
+        (
+            SELECT COALESCE(
+                jsonb_agg(DISTINCT old_col.key ORDER BY old_col.key), '[]'::jsonb
+            )
+            FROM
+                { updated_join_sql },
+                LATERAL jsonb_each(to_jsonb(old_rows)) old_col
+                JOIN LATERAL jsonb_each(to_jsonb(new_rows)) new_col
+                ON old_col.key = new_col.key
+            WHERE { updated_condition }
+            AND old_col.value IS DISTINCT FROM new_col.value
+        )
+        """
+    ).strip()
+
+    def ids_sql(rows_sql: str) -> str:
+        if not isinstance(pk, IntegerField):
+            return dedent(
+                f"""
+                (
+                    SELECT jsonb_build_object(
+                        'rows', count(*),
+                        'ids', COALESCE(jsonb_agg(id ORDER BY id), '[]'::jsonb)
+                    )
+                    FROM ({ nest_sql(rows_sql, 20) }) affected
+                )
+                """
+            ).strip()
+
+        # Compress consecutive ids into ranges of [first, last] id, by
+        # grouping on the difference between the id and the row number, which
+        # is constant within a range of consecutive ids.
+        return dedent(
+            f"""
+            (
+                SELECT jsonb_build_object(
+                    'rows', COALESCE(sum(last_id - first_id + 1), 0),
+                    'ids', COALESCE(
+                        jsonb_agg(
+                            jsonb_build_array(first_id, last_id) ORDER BY first_id
+                        ),
+                        '[]'::jsonb
+                    )
+                )
+                FROM (
+                    SELECT min(id) AS first_id, max(id) AS last_id
+                    FROM (
+                        SELECT id, id - row_number() OVER (ORDER BY id) AS island
+                        FROM ({ nest_sql(rows_sql, 24) }) affected
+                    ) numbered
+                    GROUP BY island
+                ) ranges
+            )
+            """
+        ).strip()
+
+    return dedent(
+        f"""
+        IF (TG_LEVEL = 'STATEMENT' AND TG_OP <> 'TRUNCATE') THEN
+            IF (TG_OP = 'INSERT') THEN
+                summary := { nest_sql(ids_sql(inserted_sql), 16) };
+            ELSIF (TG_OP = 'UPDATE') THEN
+                summary := { nest_sql(ids_sql(updated_sql), 16) }
+                    || jsonb_build_object('columns', { nest_sql(columns_sql, 20) });
+            ELSE
+                summary := { nest_sql(ids_sql(deleted_sql), 16) };
+            END IF;
+
+            -- Statements that didn't change any rows are not logged
+            IF (summary->>'rows')::bigint > 0 THEN
+                { nest_sql(insert_sql, 16) }
+            END IF;
+            RETURN NULL;
+        END IF;
+        """
+    ).strip()
+
+
+def _last_change_sql(
+    *, audit_logged_model: Type[Model], last_change_model: Type[Model]
+) -> str:
+    """
+    Generate the SQL that keeps the last change of the changed object up to
+    date. Inserts and updates are upserted, while deletes and truncates remove
+    the rows of the objects that no longer exist. Changes logged in summary
+    mode are not tracked, as the summary triggers return before this.
+    """
+
+    last_change_table = last_change_model._meta.db_table
+    constraint_name = f"{ last_change_model._meta.app_label }_"
+    constraint_name += f"{ last_change_model._meta.model_name }_object"
+    new_object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=last_change_model, row="NEW"
+    )
+    old_object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=last_change_model, row="OLD"
+    )
+
+    # The table is aliased, as the content_type_id column would otherwise
+    # refer to the variable with the same name.
+    return dedent(
+        f"""
+        IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') THEN
+            INSERT INTO { last_change_table } AS last_change (
+                content_type_id, object_id, action, at, performed_by_id
+            ) VALUES (
+                content_type_id,
+                { new_object_id },
+                TG_OP,
+                now(),
+                context_row.performed_by_id
+            )
+            ON CONFLICT ON CONSTRAINT { constraint_name } DO UPDATE SET
+                action = EXCLUDED.action,
+                at = EXCLUDED.at,
+                performed_by_id = EXCLUDED.performed_by_id;
+        ELSIF (TG_OP = 'DELETE') THEN
+            DELETE FROM { last_change_table } last_change
+                WHERE last_change.content_type_id = content_type_id
+                AND last_change.object_id = { old_object_id };
+        ELSIF (TG_OP = 'TRUNCATE') THEN
+            DELETE FROM { last_change_table } last_change
+                WHERE last_change.content_type_id = content_type_id;
+        END IF;
+        """
+    ).strip()
+
+
+def _rollup_sql(*, rollup_model: Optional[Type[Model]], count: str) -> str:
+    """
+    Generate the SQL that counts the given number of changes for the current
+    day, model, user and action, or an empty string without a rollup model.
+    Days are in UTC. Every change inserts a new row instead of updating a
+    shared one, so concurrent transactions never wait for each other, and the
+    counts should always be summed. The rows can be merged afterwards with
+    ChangeRollupQuerySet.compact().
+    """
+
+    if rollup_model is None:
+        return ""
+
+    rollup_table = rollup_model._meta.db_table
+
+    return dedent(
+        f"""
+        INSERT INTO { rollup_table } (
+            day, content_type_id, performed_by_id, action, count
+        ) VALUES (
+            (now() AT TIME ZONE 'UTC')::date,
+            content_type_id,
+            context_row.performed_by_id,
+            TG_OP,
+            { count }
+        );
+        """
+    ).strip()
+
+
+def _remember_entry_sql(*, insert_sql: str, object_id: str) -> str:
+    """
+    Extend the SQL that inserts a log entry to also remember which log entry was
+    written for the row in the current transaction, so later updates of the same
+    row can be merged into it. The entries are kept in a temporary table that is
+    emptied when the transaction commits.
+    """
+
+    return dedent(
+        f"""
+        { nest_sql(insert_sql, 8) }
+
+        IF to_regclass('pg_temp.audit_log_transaction_entries') IS NULL THEN
+            CREATE TEMPORARY TABLE audit_log_transaction_entries (
+                logged_content_type_id int,
+                logged_object_id text,
+                log_entry_id text NOT NULL,
+                PRIMARY KEY (logged_content_type_id, logged_object_id)
+            ) ON COMMIT DELETE ROWS;
+        END IF;
+
+        INSERT INTO audit_log_transaction_entries
+            VALUES (content_type_id, ({ object_id })::text, entry_id::text)
+            ON CONFLICT (logged_content_type_id, logged_object_id)
+            DO UPDATE SET log_entry_id = EXCLUDED.log_entry_id;
+        """
+    ).strip()
+
+
+def _coalesce_update_sql(
+    *,
+    audit_logged_model: Type[Model],
+    log_entry_model: Type[Model],
+    update_sql: str,
+) -> str:
+    """
+    Wrap the SQL that logs an update so that, if the row has already been
+    logged in the current transaction, the changes are merged into the existing
+    log entry instead. Merging into an insert entry replaces the inserted values
+    with the values logged for an insert of the new row, while merging into an
+    update entry keeps the first old value and the last new value of each
+    column. Path-level diffs of JSON columns are concatenated instead.
+    """
+
+    insert_changes = _insert_changes_sql(audit_logged_model=audit_logged_model)
+    update_changes = update_changes_sql(audit_logged_model=audit_logged_model)
+    json_diff_columns = json_diff_columns_sql(audit_logged_model)
+    object_id = object_id_sql(
+        audit_logged_model=audit_logged_model, model=log_entry_model, row="NEW"
+    )
+    entry_id_column = log_entry_model._meta.pk.column
+
+    merged_value = dedent(
+        """
+        jsonb_build_array(
+            COALESCE(previous.value->0, current.value->0),
+            COALESCE(current.value->1, previous.value->1)
+        )
+        """
+    ).strip()
+    reverted = "merged.value->0 IS DISTINCT FROM merged.value->1"
+    if json_diff_columns:
+        merged_value = dedent(
+            f"""
+            CASE WHEN COALESCE(previous.key, current.key) IN ({ json_diff_columns })
+            THEN COALESCE(previous.value, '[]') || COALESCE(current.value, '[]')
+            ELSE { nest_sql(merged_value, 12) }
+            END
+            """
+        ).strip()
+        reverted = f"merged.key IN ({ json_diff_columns }) OR { reverted }"
+
+    return dedent(
+        f"""
+        entry_id := NULL;
+        IF to_regclass('pg_temp.audit_log_transaction_entries') IS NOT NULL THEN
+            SELECT log_entry_id::{ _entry_id_type(log_entry_model) } INTO entry_id
+                FROM audit_log_transaction_entries
+                WHERE logged_content_type_id = content_type_id
+                AND logged_object_id = ({ object_id })::text;
+        END IF;
+
+        IF entry_id IS NOT NULL THEN
+            UPDATE { log_entry_model._meta.db_table } entry SET changes = CASE
+                WHEN entry.action = 'INSERT' THEN { nest_sql(insert_changes, 16) }
+                ELSE COALESCE((
+                    SELECT jsonb_object_agg(merged.key, merged.value)
+                    FROM (
+                        SELECT
+                            COALESCE(previous.key, current.key) AS key,
+                            { nest_sql(merged_value, 28) } AS value
+                        FROM
+                            jsonb_each(entry.changes) previous
+                            FULL OUTER JOIN
+                            jsonb_each({ nest_sql(update_changes, 28) }) current
+                            ON previous.key = current.key
+                    ) merged
+                    -- Drop columns that were changed back to their old value
+                    WHERE { reverted }
+                ), '{{}}'::jsonb)
+            END
+            WHERE entry.{ entry_id_column } = entry_id
+            RETURNING entry.{ entry_id_column } INTO STRICT entry_id;
+        ELSE
+            { nest_sql(update_sql, 12) }
+        END IF;
+        """
+    ).strip()
+
+
+def drop_trigger_function_sql(
+    *,
+    audit_logged_model: Type[Model],
+) -> str:
+    """
+    Create the SQL required to drop the trigger function for the given model
+    """
+
+    return f"DROP FUNCTION { audit_logged_model._meta.db_table }_log_change"
+
+
+def create_triggers_sql(*, audit_logged_model: Type[Model]) -> Sequence[str]:
+    """
+    Create the SQL requried to set up triggers for audit logging to the given
+    audit log entry model.
+    """
+
+    # Get the model that we are audit logging
+    audit_logged_table = audit_logged_model._meta.db_table  # noqa
+    trigger_function_name = f"{audit_logged_table}_log_change"
+
+    # If the model is only partially audit logged we add the condition to the
+    # WHEN clause of the triggers, so the trigger function is never invoked for
+    # rows we don't care about.
+    new_condition = condition_sql(audit_logged_model=audit_logged_model, row="NEW")
+    old_condition = condition_sql(audit_logged_model=audit_logged_model, row="OLD")
+
+    insert_conditions = [f"({ new_condition })"] if new_condition else []
+    update_conditions = ["OLD.* IS DISTINCT FROM NEW.*"]
+    if new_condition and old_condition:
+        update_conditions.append(f"(({ old_condition }) OR ({ new_condition }))")
+    delete_conditions = [f"({ old_condition })"] if old_condition else []
+
+    # In summary mode the changes are logged by the statement level triggers
+    # below instead, so skip the row level triggers.
+    audit_logs_field = get_audit_logs_field(audit_logged_model)
+    allow_summary_logging = (
+        audit_logs_field is not None and audit_logs_field.allow_summary_logging
+    )
+    if allow_summary_logging:
+        for conditions in (insert_conditions, update_conditions, delete_conditions):
+            conditions.append(f"NOT { SUMMARY_MODE_SQL }")
+
+    insert_when = _when_sql(insert_conditions)
+    update_when = _when_sql(update_conditions)
+    delete_when = _when_sql(delete_conditions)
+
+    insert_trigger = dedent(
+        f"""
+        CREATE TRIGGER log_insert
+        AFTER INSERT ON { audit_logged_table }
+        FOR EACH ROW
+        { insert_when }
+        EXECUTE FUNCTION { trigger_function_name }()
+        """
+    )
+
+    update_trigger = dedent(
+        f"""
+        CREATE TRIGGER log_update
+        AFTER UPDATE ON { audit_logged_table }
+        FOR EACH ROW
+        { update_when }
+        EXECUTE FUNCTION { trigger_function_name }()
+        """
+    )
+
+    delete_trigger = dedent(
+        f"""
+        CREATE TRIGGER log_delete
+        AFTER DELETE ON { audit_logged_table }
+        FOR EACH ROW
+        { delete_when }
+        EXECUTE FUNCTION { trigger_function_name }()
+        """
+    )
+
+    # Truncates don't fire the row level triggers, so log them with a statement
+    # level trigger. If the rows should be counted this has to run before the
+    # table is truncated.
+    truncate_timing = "AFTER"
+    if audit_logs_field is not None and audit_logs_field.truncate_row_count:
+        truncate_timing = "BEFORE"
+
+    # Flushing the database with Django truncates all tables without audit
+    # logging context, so it's marked to not be logged, see DatabaseOperations.
+    truncate_trigger = dedent(
+        f"""
+        CREATE TRIGGER log_truncate
+        { truncate_timing } TRUNCATE ON { audit_logged_table }
+        FOR EACH STATEMENT
+        WHEN (current_setting('audit_log.flushing', true) IS DISTINCT FROM 'on')
+        EXECUTE FUNCTION { trigger_function_name }()
+        """
+    )
+
+    triggers = [insert_trigger, update_trigger, delete_trigger, truncate_trigger]
+
+    # Collecting the transition tables has a cost for every statement, even
+    # when the WHEN clause is false, so these are only added when enabled.
+    if allow_summary_logging:
+        for action, transition_tables in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            triggers.append(
+                dedent(
+                    f"""
+                    CREATE TRIGGER log_{ action.lower() }_summary
+                    AFTER { action } ON { audit_logged_table }
+                    REFERENCING { transition_tables }
+                    FOR EACH STATEMENT
+                    WHEN ({ SUMMARY_MODE_SQL })
+                    EXECUTE FUNCTION { trigger_function_name }()
+                    """
+                )
+            )
+
+    return triggers
+
+
+def _when_sql(conditions: Sequence[str]) -> str:
+    """
+    Generate the WHEN clause of a trigger from a list of conditions that must
+    all hold, or an empty string if there are none.
+    """
+
+    if not conditions:
+        return ""
+
+    return f"WHEN ({ ' AND '.join(conditions) })"
+
+
+def drop_triggers_sql(*, audit_logged_model: Type[Model]) -> Sequence[str]:
+    """
+    Generate the SQL required to remove the audit logging triggers for the
+    given audit log entry model.
+    """
+
+    # Need to use _meta, so disable protected property access checks
+    # pylint: disable=protected-access
+
+    # Get the model that we are audit logging
+    audit_logged_table = audit_logged_model._meta.db_table  # noqa
+
+    return (
+        f"DROP TRIGGER log_insert ON { audit_logged_table }",
+        f"DROP TRIGGER log_update ON { audit_logged_table }",
+        f"DROP TRIGGER log_delete ON { audit_logged_table }",
+        # Tables audit logged before truncates were logged don't have this one
+        f"DROP TRIGGER IF EXISTS log_truncate ON { audit_logged_table }",
+        # These only exist if summary logging is allowed for the model
+        f"DROP TRIGGER IF EXISTS log_insert_summary ON { audit_logged_table }",
+        f"DROP TRIGGER IF EXISTS log_update_summary ON { audit_logged_table }",
+        f"DROP TRIGGER IF EXISTS log_delete_summary ON { audit_logged_table }",
+    )
+
+
+def create_content_type_sql(*, audit_logged_model: Type[Model]) -> str:
+    """
+    Generate the SQL required to ensure the ContentType object exists for the
+    given model. We eagerly create this as it's used by the trigger and we don't
+    want to create it on demand there, which is what Django usually does.
+    """
+
+    app_label = audit_logged_model._meta.app_label
+    model_name = audit_logged_model._meta.model_name
+
+    return dedent(
+        f"""
+        INSERT INTO django_content_type (app_label, model)
+        VALUES ('{app_label}', '{model_name}')
+        ON CONFLICT (app_label, model) DO NOTHING
+        """
+    )
+
+
+def condition_sql(*, audit_logged_model: Type[Model], row: str) -> Optional[str]:
+    """
+    Generate the SQL for the condition on the model's AuditLogsField, with the
+    columns referencing the given row variable in the trigger (NEW or OLD).
+    Returns None if the model doesn't have a condition.
+
+    The SQL is always executed with query parameters, by the schema editor or
+    the backfill, so literal percent signs in the condition are escaped.
+    """
+
+    field = get_audit_logs_field(audit_logged_model)
+    if field is None or field.condition is None:
+        return None
+
+    if isinstance(field.condition, str):
+        # Not str.format, so braces can still be used in the predicate
+        return field.condition.replace("{row}", row).replace("%", "%%")
+
+    # Compile the Q object in the same way Django compiles check constraints,
+    # but replace the table name with the row variable.
+    query = Query(model=audit_logged_model)
+    where = query.build_where(field.condition)
+    compiler = query.get_compiler(connection=connection)
+    sql, params = where.as_sql(compiler, connection)
+
+    table_name = connection.ops.quote_name(audit_logged_model._meta.db_table)
+    sql = sql.replace(f"{table_name}.", f"{row}.")
+
+    # Keep the escaped percent signs of the compiled SQL escaped, the values
+    # are already escaped by quote_value.
+    sql = sql.replace("%%", "%%%%")
+    return sql % tuple(quote_value(param) for param in params)
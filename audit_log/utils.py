@@ -3,8 +3,7 @@ Various helpers.
 """
 
 from functools import lru_cache
-from textwrap import dedent
-from typing import List, Sequence, Type
+from typing import List, Optional, Sequence, Type, cast
 
 from django.apps import apps
 from django.apps.registry import Apps
@@ -12,9 +11,18 @@ from django.conf import settings
 from django.db.backends.postgresql.base import (
     DatabaseWrapper as PostgreSQLDatabaseWrapper,
 )
-from django.db.models import AutoField, Field, ForeignKey, JSONField, Model
-
-from . import fields
+from django.db.models import Field, ForeignKey, JSONField, Model
+
+from .fields import get_audit_logs_field
+from .history import create_history_table_sql
+from .triggers import (
+    create_trigger_function_sql,
+    create_triggers_sql,
+    create_uuid_v7_function_sql,
+    drop_trigger_function_sql,
+    drop_triggers_sql,
+    generates_log_entry_ids,
+)
 
 
 def _column_sql(field: Field) -> str:
@@ -85,288 +93,168 @@ def create_temporary_table_sql(model: Type[Model]) -> str:
     return sql
 
 
-def drop_temporary_table_sql(model: Type[Model]) -> str:
+def clear_temporary_table_sql(model: Type[Model]) -> str:
     """
-    Generate the SQL required to drop the temporary table for the given model.
+    Generate the SQL required to remove all rows from the temporary table for
+    the given model, so it can be reused.
     """
 
     # Need to use _meta, so disable protected property access checks
     # pylint: disable=protected-access
 
-    return f"DROP TABLE {model._meta.db_table}"
+    return f"DELETE FROM {model._meta.db_table}"
 
 
-def create_trigger_function_sql(
-    *,
-    audit_logged_model: Type[Model],
-    context_model: Type[Model],
-    log_entry_model: Type[Model],
-) -> str:
+def drop_temporary_table_sql(model: Type[Model]) -> str:
     """
-    Generate the SQL to create the function to log the SQL.
+    Generate the SQL required to drop the temporary table for the given model.
     """
 
-    trigger_function_name = f"{ audit_logged_model._meta.db_table }_log_change"
-
-    context_table_name = context_model._meta.db_table  # noqa
-    context_fields = ", ".join(
-        field.column
-        for field in context_model._meta.get_fields()  # noqa
-        if isinstance(field, Field) and not isinstance(field, AutoField)
-    )
+    # Need to use _meta, so disable protected property access checks
+    # pylint: disable=protected-access
 
-    log_entry_table_name = log_entry_model._meta.db_table
-
-    return dedent(
-        f"""
-        CREATE FUNCTION { trigger_function_name }()
-        RETURNS TRIGGER AS $$
-        DECLARE
-            -- Id of the inserted row, used to ensure exactly one row is inserted
-            entry_id int;
-            content_type_id int;
-        BEGIN
-            SELECT id INTO STRICT content_type_id
-                FROM django_content_type WHERE
-                app_label = '{ audit_logged_model._meta.app_label }'
-                AND model = '{ audit_logged_model._meta.model_name }';
-
-            IF (TG_OP = 'INSERT') THEN
-                INSERT INTO { log_entry_table_name } (
-                    { context_fields },
-                    action,
-                    at,
-                    changes,
-                    content_type_id,
-                    object_id
-                ) SELECT
-                    { context_fields },
-                    TG_OP as action,
-                    now() as at,
-                    to_jsonb(NEW.*) as changes,
-                    content_type_id,
-                    NEW.id as object_id
-                -- We rely on this table being created by out Django middleware
-                FROM { context_table_name }
-                -- We return the id into the variable to make postgresql check
-                -- that exactly one row is inserted.
-                RETURNING id INTO STRICT entry_id;
-                RETURN NEW;
-            ELSIF (TG_OP = 'UPDATE') THEN
-                INSERT INTO { log_entry_table_name } (
-                    { context_fields },
-                    action,
-                    at,
-                    changes,
-                    content_type_id,
-                    object_id
-                ) SELECT
-                    { context_fields },
-                    TG_OP as action,
-                    now() as at,
-                    (
-                        SELECT
-                            -- Aggregate back to a single jsonb object, with
-                            -- column name as key and the two values in an array.
-                            jsonb_object_agg(
-                                COALESCE(old_row.key, new_row.key),
-                                ARRAY[old_row.value, new_row.value]
-                            )
-                        FROM
-                            -- Select key value pairs from the old and the new
-                            -- row, and then join them on the key. THis gives
-                            -- us rows with the same key and values from both
-                            -- the old row and the new row.
-                            jsonb_each(to_jsonb(OLD.*)) old_row
-                            FULL OUTER JOIN
-                            jsonb_each(to_jsonb(NEW.*)) new_row
-                            ON old_row.key = new_row.key
-                        WHERE
-                            -- Only select rows that have actually changed
-                            old_row.* IS DISTINCT FROM new_row.*
-                    ) as changes,
-                    content_type_id,
-                    NEW.id as object_id
-                -- We rely on this table being created by out Django middleware
-                FROM { context_table_name }
-                -- We return the id into the variable to make postgresql check
-                -- that exactly one row is inserted.
-                RETURNING id INTO STRICT entry_id;
-                RETURN NEW;
-            ELSIF (TG_OP = 'DELETE') THEN
-                INSERT INTO { log_entry_table_name } (
-                    { context_fields },
-                    action,
-                    at,
-                    changes,
-                    content_type_id,
-                    object_id
-                ) SELECT
-                    { context_fields },
-                    TG_OP as action,
-                    now() as at,
-                    to_jsonb(OLD.*) as changes,
-                    content_type_id,
-                    OLD.id as object_id
-                -- We rely on this table being created by out Django middleware
-                FROM { context_table_name }
-                -- We return the id into the variable to make postgresql check
-                -- that exactly one row is inserted.
-                RETURNING id INTO STRICT entry_id;
-                RETURN NEW;
-            END IF;
-        END;
-        $$ language 'plpgsql';
-        """
-    )
+    return f"DROP TABLE {model._meta.db_table}"
 
 
-def drop_trigger_function_sql(
-    *,
-    audit_logged_model: Type[Model],
-) -> str:
+def get_context_model(_apps: Apps = None) -> Type[Model]:
     """
-    Create the SQL required to drop the trigger function for the given model
+    Helper to get the audit log context model, either from the specified app
+    directory or the global Django one.
     """
 
-    return f"DROP FUNCTION { audit_logged_model._meta.db_table }_log_change"
+    app_label, model_name = settings.AUDIT_LOG_CONTEXT_MODEL.rsplit(".", 1)
+    return (_apps or apps).get_model(app_label, model_name)
 
 
-def create_triggers_sql(*, audit_logged_model: Type[Model]) -> Sequence[str]:
+def get_log_entry_model(_apps: Apps = None) -> Type[Model]:
     """
-    Create the SQL requried to set up triggers for audit logging to the given
-    audit log entry model.
+    Helper to get the audit log entry model, either from the specified app
+    directory or the global Django one.
     """
 
-    # Get the model that we are audit logging
-    audit_logged_table = audit_logged_model._meta.db_table  # noqa
-    trigger_function_name = f"{audit_logged_table}_log_change"
-
-    insert_trigger = dedent(
-        f"""
-        CREATE TRIGGER log_insert
-        AFTER INSERT ON { audit_logged_table }
-        FOR EACH ROW
-        EXECUTE FUNCTION { trigger_function_name }()
-        """
-    )
-
-    update_trigger = dedent(
-        f"""
-        CREATE TRIGGER log_update
-        AFTER UPDATE ON { audit_logged_table }
-        FOR EACH ROW
-        WHEN (OLD.* IS DISTINCT FROM NEW.*)
-        EXECUTE FUNCTION { trigger_function_name }()
-        """
-    )
-
-    delete_trigger = dedent(
-        f"""
-        CREATE TRIGGER log_delete
-        AFTER DELETE ON { audit_logged_table }
-        FOR EACH ROW
-        EXECUTE FUNCTION { trigger_function_name }()
-        """
-    )
-
-    return (insert_trigger, update_trigger, delete_trigger)
+    app_label, model_name = settings.AUDIT_LOG_ENTRY_MODEL.rsplit(".", 1)
+    return (_apps or apps).get_model(app_label, model_name)
 
 
-def drop_triggers_sql(*, audit_logged_model: Type[Model]) -> Sequence[str]:
+def get_last_change_model(_apps: Apps = None) -> Optional[Type[Model]]:
     """
-    Generate the SQL required to remove the audit logging triggers for the
-    given audit log entry model.
+    Helper to get the model that keeps track of the last change of each audit
+    logged object, or None if the AUDIT_LOG_LAST_CHANGE_MODEL setting is not
+    set.
     """
 
-    # Need to use _meta, so disable protected property access checks
-    # pylint: disable=protected-access
-
-    # Get the model that we are audit logging
-    audit_logged_table = audit_logged_model._meta.db_table  # noqa
+    label = getattr(settings, "AUDIT_LOG_LAST_CHANGE_MODEL", None)
+    if label is None:
+        return None
 
-    return (
-        f"DROP TRIGGER log_insert ON { audit_logged_table }",
-        f"DROP TRIGGER log_update ON { audit_logged_table }",
-        f"DROP TRIGGER log_delete ON { audit_logged_table }",
-    )
+    app_label, model_name = label.rsplit(".", 1)
+    return (_apps or apps).get_model(app_label, model_name)
 
 
-def create_content_type_sql(*, audit_logged_model: Type[Model]) -> str:
+def get_rollup_model(_apps: Apps = None) -> Optional[Type[Model]]:
     """
-    Generate the SQL required to ensure the ContentType object exists for the
-    given model. We eagerly create this as it's used by the trigger and we don't
-    want to create it on demand there, which is what Django usually does.
+    Helper to get the model that counts the changes per day, or None if the
+    AUDIT_LOG_ROLLUP_MODEL setting is not set.
     """
 
-    app_label = audit_logged_model._meta.app_label
-    model_name = audit_logged_model._meta.model_name
+    label = getattr(settings, "AUDIT_LOG_ROLLUP_MODEL", None)
+    if label is None:
+        return None
 
-    return dedent(
-        f"""
-        INSERT INTO django_content_type (app_label, model)
-        VALUES ('{app_label}', '{model_name}')
-        ON CONFLICT (app_label, model) DO NOTHING
-        """
-    )
+    app_label, model_name = label.rsplit(".", 1)
+    return (_apps or apps).get_model(app_label, model_name)
 
 
-def is_audit_logs_field(field: Field) -> bool:
+def get_logged_to_model(
+    *, audit_logged_model: Type[Model], default: Type[Model]
+) -> Type[Model]:
     """
-    Check if a given field is an AuditLogsField
+    Get the log entry model that changes to the given model are logged to, as
+    set on its AuditLogsField. This allows spreading the log entries of
+    different models over multiple tables. The default is used if the model is
+    not audit logged, or the relation is not resolved yet.
     """
 
-    return isinstance(field, fields.AuditLogsField)
+    field = get_audit_logs_field(audit_logged_model)
+    if field is None or isinstance(field.remote_field.model, str):
+        return default
 
+    return cast(Type[Model], field.remote_field.model)
 
-def has_audit_logs_field(model: Type[Model]) -> bool:
-    """
-    Check if any of the model's fields is an AuditLogsField
+
+def add_audit_logging_sql(
+    *,
+    audit_logged_model: Type[Model],
+    context_model: Type[Model],
+    log_entry_model: Type[Model],
+) -> List[str]:
     """
+    Get the SQL required to set up audit logging for the given model. Changes
+    are logged to the log entry model given, unless the AuditLogsField of the
+    model points to another log entry model.
 
-    return any(is_audit_logs_field(field) for field in model._meta.local_fields)
+    The last change and rollup models are looked up from the global app
+    registry, as the trigger function only refers to their tables.
+    """
 
+    log_entry_model = get_logged_to_model(
+        audit_logged_model=audit_logged_model, default=log_entry_model
+    )
 
-def get_context_model(_apps: Apps = None) -> Type[Model]:
-    """
-    Helper to get the audit log context model, either from the specified app
-    directory or the global Django one.
-    """
+    sql = []
 
-    app_label, model_name = settings.AUDIT_LOG_CONTEXT_MODEL.rsplit(".", 1)
-    return (_apps or apps).get_model(app_label, model_name)
+    audit_logs_field = get_audit_logs_field(audit_logged_model)
+    if audit_logs_field is not None and audit_logs_field.history:
+        sql.extend(create_history_table_sql(audit_logged_model=audit_logged_model))
 
+    if generates_log_entry_ids(log_entry_model):
+        sql.append(create_uuid_v7_function_sql())
 
-def get_log_entry_model(_apps: Apps = None) -> Type[Model]:
-    """
-    Helper to get the audit log entry model, either from the specified app
-    directory or the global Django one.
-    """
+    sql.append(
+        create_trigger_function_sql(
+            audit_logged_model=audit_logged_model,
+            context_model=context_model,
+            log_entry_model=log_entry_model,
+            last_change_model=get_last_change_model(),
+            rollup_model=get_rollup_model(),
+        )
+    )
+    sql.extend(create_triggers_sql(audit_logged_model=audit_logged_model))
 
-    app_label, model_name = settings.AUDIT_LOG_ENTRY_MODEL.rsplit(".", 1)
-    return (_apps or apps).get_model(app_label, model_name)
+    return sql
 
 
-def add_audit_logging_sql(
+def refresh_audit_logging_sql(
     *,
     audit_logged_model: Type[Model],
     context_model: Type[Model],
     log_entry_model: Type[Model],
 ) -> List[str]:
     """
-    Get the SQL required to set up audit logging for the given model.
+    Get the SQL to replace the trigger function of a model that is already
+    audit logged, so it picks up changes to the settings for the last change
+    and rollup models, and changes to this package. The triggers and the
+    history table are left as they are.
     """
 
+    log_entry_model = get_logged_to_model(
+        audit_logged_model=audit_logged_model, default=log_entry_model
+    )
+
     sql = []
 
+    if generates_log_entry_ids(log_entry_model):
+        sql.append(create_uuid_v7_function_sql())
+
     sql.append(
         create_trigger_function_sql(
             audit_logged_model=audit_logged_model,
             context_model=context_model,
             log_entry_model=log_entry_model,
+            last_change_model=get_last_change_model(),
+            rollup_model=get_rollup_model(),
         )
     )
-    sql.extend(create_triggers_sql(audit_logged_model=audit_logged_model))
 
     return sql
 
@@ -380,3 +268,12 @@ def remove_audit_logging_sql(*, audit_logged_model: Type[Model]) -> List[str]:
     sql.extend(drop_triggers_sql(audit_logged_model=audit_logged_model))
     sql.append(drop_trigger_function_sql(audit_logged_model=audit_logged_model))
     return sql
+
+
+def join_sql(sql: Sequence[str]) -> str:
+    """
+    Join SQL statements, so they can be executed together in a single round
+    trip to the database.
+    """
+
+    return ";\n".join(query.strip().rstrip(";") for query in sql)
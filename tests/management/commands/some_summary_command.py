@@ -0,0 +1,22 @@
+from typing import Any
+
+from audit_log.management.base import AuditLoggedCommand
+
+from ...models import MySummaryAuditLoggedModel
+
+
+class Command(AuditLoggedCommand):
+    """
+    Test command to check that summary logging works as expected.
+    """
+
+    summary_logging = True
+
+    def handle(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Write a few rows to a model that allows summary logging, just to test
+        """
+
+        MySummaryAuditLoggedModel.objects.bulk_create(
+            MySummaryAuditLoggedModel(some_text=f"Hello command {i}") for i in range(3)
+        )
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:15
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0003_remove_mynolongerauditloggedmodel_audit_logs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyPartiallyAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('is_internal', models.BooleanField(default=False)),
+                ('audit_logs', audit_log.fields.AuditLogsField(condition=models.Q(('is_internal', False)), to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
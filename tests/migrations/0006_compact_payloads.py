@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:20
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0005_mycoalescedauditloggedmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyCompactAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('some_number', models.IntegerField(default=0)),
+                ('some_note', models.TextField(null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=models.Index(fields=['content_type', 'object_id'], name='tests_audit_content_a9aaf1_idx'),
+        ),
+        migrations.AddField(
+            model_name='mycompactauditloggedmodel',
+            name='audit_logs',
+            field=audit_log.fields.AuditLogsField(delete_payload='pk_only', insert_payload='non_default', to='tests.auditlogentry'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:21
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0006_compact_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyValuePoliciesAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('hashed_text', models.TextField()),
+                ('truncated_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(to='tests.auditlogentry', value_policies={'hashed_text': 'md5', 'truncated_text': ('truncate', 4)})),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
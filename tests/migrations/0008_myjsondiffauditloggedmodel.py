@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:23
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0007_myvaluepoliciesauditloggedmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyJsonDiffAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('settings', models.JSONField(default=dict)),
+                ('audit_logs', audit_log.fields.AuditLogsField(json_diff_fields=['settings'], to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
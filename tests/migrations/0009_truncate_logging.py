@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:25
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0008_myjsondiffauditloggedmodel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlogentry',
+            name='action',
+            field=models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE')], max_length=8),
+        ),
+        migrations.CreateModel(
+            name='MyTruncatedAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MyTruncateCountedAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(to='tests.auditlogentry', truncate_row_count=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
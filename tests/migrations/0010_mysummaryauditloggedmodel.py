@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:28
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0009_truncate_logging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MySummaryAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('some_number', models.IntegerField(default=0)),
+                ('audit_logs', audit_log.fields.AuditLogsField(allow_summary_logging=True, to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
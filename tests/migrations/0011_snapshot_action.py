@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0010_mysummaryauditloggedmodel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlogentry',
+            name='action',
+            field=models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE'), ('Snapshot', 'SNAPSHOT')], max_length=8),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tests', '0012_separate_log_entry_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE')], max_length=8)),
+                ('at', models.DateTimeField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='lastchange',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='tests_lastchange_object'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:41
+
+import audit_log.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0013_last_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyHistoryAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(history=True, to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:43
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0014_history_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlogentry',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['changes'], name='tests_auditlogentry_changes'),
+        ),
+    ]
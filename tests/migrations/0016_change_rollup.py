@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tests', '0015_changes_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('action', models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE')], max_length=8)),
+                ('count', models.BigIntegerField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='changerollup',
+            index=models.Index(fields=['content_type', 'day', 'action'], name='tests_chang_content_50b91f_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:48
+
+import audit_log.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tests', '0016_change_rollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lastchange',
+            name='object_id',
+            field=models.TextField(),
+        ),
+        migrations.CreateModel(
+            name='UuidAuditLogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('context_type', models.CharField(choices=[('HTTP request', 'http-request'), ('Management command', 'management-command'), ('Celery task', 'celery-task'), ('Test', 'test')], max_length=128)),
+                ('context', models.JSONField()),
+                ('action', models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE'), ('Snapshot', 'SNAPSHOT')], max_length=8)),
+                ('at', models.DateTimeField()),
+                ('changes', models.JSONField()),
+                ('object_id', models.UUIDField(null=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MyUuidAuditLoggedModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(coalesce_changes=True, to='tests.uuidauditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MyBigAuditLoggedModel',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(to='tests.auditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uuidauditlogentry',
+            index=models.Index(fields=['content_type', 'object_id'], name='tests_uuida_content_2b494c_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:04
+
+import audit_log.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tests', '0018_log_entry_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MyContextColumnsAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('context_type', models.CharField(max_length=128)),
+                ('context', models.JSONField(default=dict)),
+                ('audit_logs', audit_log.fields.AuditLogsField(to='tests.auditlogentry')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
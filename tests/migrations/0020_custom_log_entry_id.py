@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:08
+
+import audit_log.fields
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('tests', '0019_mycontextcolumnsauditloggedmodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomIdAuditLogEntry',
+            fields=[
+                ('object_id', models.PositiveIntegerField(null=True)),
+                ('context_type', models.CharField(choices=[('HTTP request', 'http-request'), ('Management command', 'management-command'), ('Celery task', 'celery-task'), ('Test', 'test')], max_length=128)),
+                ('context', models.JSONField()),
+                ('action', models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE'), ('Snapshot', 'SNAPSHOT')], max_length=8)),
+                ('at', models.DateTimeField()),
+                ('changes', models.JSONField()),
+                ('id', models.BigAutoField(db_column='entry_id', primary_key=True, serialize=False)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MyCustomIdAuditLoggedModel',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('some_text', models.TextField()),
+                ('audit_logs', audit_log.fields.AuditLogsField(coalesce_changes=True, to='tests.customidauditlogentry')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='customidauditlogentry',
+            index=models.Index(fields=['content_type', 'object_id'], name='tests_custo_content_ec894e_idx'),
+        ),
+    ]
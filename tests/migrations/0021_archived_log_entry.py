@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tests', '0020_custom_log_entry_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAuditLogEntry',
+            fields=[
+                ('object_id', models.PositiveIntegerField(null=True)),
+                ('context_type', models.CharField(choices=[('HTTP request', 'http-request'), ('Management command', 'management-command'), ('Celery task', 'celery-task'), ('Test', 'test')], max_length=128)),
+                ('context', models.JSONField()),
+                ('action', models.CharField(choices=[('Insert', 'INSERT'), ('Update', 'UPDATE'), ('Delete', 'DELETE'), ('Truncate', 'TRUNCATE'), ('Snapshot', 'SNAPSHOT')], max_length=8)),
+                ('at', models.DateTimeField()),
+                ('changes', models.JSONField()),
+                ('entry_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedauditlogentry',
+            index=models.Index(fields=['content_type', 'object_id'], name='tests_archi_content_b4c5a8_idx'),
+        ),
+    ]
@@ -1,6 +1,17 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 
-from audit_log.models import AuditLoggedModel, BaseContext, BaseLogEntry
+from audit_log.fields import AuditLogsField
+from audit_log.models import (
+    AuditLoggedModel,
+    BaseChangeRollup,
+    BaseContext,
+    BaseLastChange,
+    BaseLogEntry,
+)
 
 
 class AuditLogContext(BaseContext):
@@ -17,6 +28,20 @@ class AuditLogEntry(BaseLogEntry):
     An audit log entry
     """
 
+    class Meta(BaseLogEntry.Meta):
+        indexes = [
+            *BaseLogEntry.Meta.indexes,
+            GinIndex(fields=["changes"], name="tests_auditlogentry_changes"),
+        ]
+
+
+class OtherAuditLogEntry(BaseLogEntry):
+    """
+    An audit log entry in a separate table, for some models only
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
 
 class MyNonAuditLoggedModel(models.Model):
     """
@@ -64,3 +89,217 @@ class MyNoLongerManuallyAuditLoggedModel(models.Model):
     """
 
     some_text = models.TextField()
+
+
+class MyPartiallyAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where only rows that are not internal are audit logged.
+    """
+
+    some_text = models.TextField()
+    is_internal = models.BooleanField(default=False)
+
+    audit_logs = AuditLogsField(condition=models.Q(is_internal=False))
+
+
+class MyCoalescedAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where changes within a transaction are merged into one log entry.
+    """
+
+    some_text = models.TextField()
+    some_number = models.IntegerField(default=0)
+
+    audit_logs = AuditLogsField(coalesce_changes=True)
+
+
+class MyCompactAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where inserts and deletes are logged with compact payloads.
+    """
+
+    some_text = models.TextField()
+    some_number = models.IntegerField(default=0)
+    some_note = models.TextField(null=True)
+
+    audit_logs = AuditLogsField(insert_payload="non_default", delete_payload="pk_only")
+
+
+class MyValuePoliciesAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where some values are hashed or truncated in the log entries.
+    """
+
+    some_text = models.TextField()
+    hashed_text = models.TextField()
+    truncated_text = models.TextField()
+
+    audit_logs = AuditLogsField(
+        value_policies={"hashed_text": "md5", "truncated_text": ("truncate", 4)}
+    )
+
+
+class MyJsonDiffAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where updates to a JSON field are logged with a path-level diff.
+    """
+
+    some_text = models.TextField()
+    settings = models.JSONField(default=dict)
+
+    audit_logs = AuditLogsField(json_diff_fields=["settings"])
+
+
+class MyTruncatedAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where truncates are logged.
+    """
+
+    some_text = models.TextField()
+
+
+class MyTruncateCountedAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where truncates are logged with the number of removed rows.
+    """
+
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField(truncate_row_count=True)
+
+
+class MySummaryAuditLoggedModel(AuditLoggedModel):
+    """
+    A model where changes can be logged with one log entry per statement.
+    """
+
+    some_text = models.TextField()
+    some_number = models.IntegerField(default=0)
+
+    audit_logs = AuditLogsField(allow_summary_logging=True)
+
+
+class MySeparatelyAuditLoggedModel(AuditLoggedModel):
+    """
+    A model that is audit logged to a separate log entry table.
+    """
+
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField("tests.OtherAuditLogEntry")
+
+
+class LastChange(BaseLastChange):
+    """
+    The last change of each audit logged object
+    """
+
+    # Stored as text, as the audit logged models have different primary key
+    # types
+    object_id = models.TextField()
+
+
+class UuidAuditLogEntry(BaseLogEntry):
+    """
+    An audit log entry for models with UUID primary keys
+    """
+
+    object_id = models.UUIDField(null=True)
+
+
+class MyUuidAuditLoggedModel(AuditLoggedModel):
+    """
+    A model with a UUID primary key, audit logged to a log entry table with
+    UUID object ids.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField("tests.UuidAuditLogEntry", coalesce_changes=True)
+
+
+class TimeOrderedAuditLogEntry(BaseLogEntry):
+    """
+    An audit log entry with time ordered UUID ids generated by the triggers
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+
+
+class MyTimeOrderedAuditLoggedModel(AuditLoggedModel):
+    """
+    A model that is audit logged to a log entry table with UUID ids.
+    """
+
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField("tests.TimeOrderedAuditLogEntry", coalesce_changes=True)
+
+
+class MyBigAuditLoggedModel(AuditLoggedModel):
+    """
+    A model with a bigint primary key, audit logged to a log entry table with
+    integer object ids.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    some_text = models.TextField()
+
+
+class MyHistoryAuditLoggedModel(AuditLoggedModel):
+    """
+    A model that keeps the history of its rows.
+    """
+
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField(history=True)
+
+
+class ChangeRollup(BaseChangeRollup):
+    """
+    The number of changes per day
+    """
+
+
+class MyContextColumnsAuditLoggedModel(AuditLoggedModel):
+    """
+    A model with columns named like the columns of the context table.
+    """
+
+    context_type = models.CharField(max_length=128)
+    context = models.JSONField(default=dict)
+    performed_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="+",
+    )
+
+
+class CustomIdAuditLogEntry(BaseLogEntry):
+    """
+    An audit log entry with a primary key column that is not named id
+    """
+
+    id = models.BigAutoField(primary_key=True, db_column="entry_id")
+
+
+class ArchivedAuditLogEntry(BaseLogEntry):
+    """
+    An archived audit log entry, with a primary key field that is not named id
+    """
+
+    entry_id = models.BigAutoField(primary_key=True)
+
+
+class MyCustomIdAuditLoggedModel(AuditLoggedModel):
+    """
+    A model with coalesced changes, audit logged to a log entry table with a
+    primary key column that is not named id.
+    """
+
+    some_text = models.TextField()
+
+    audit_logs = AuditLogsField("tests.CustomIdAuditLogEntry", coalesce_changes=True)
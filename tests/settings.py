@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "audit_log",
     "tests",
 ]
 
@@ -131,3 +132,5 @@ AUDIT_LOG_CONTEXT_TYPE_CHOICES = (
     ("Test", "test"),
 )
 AUDIT_LOG_ENTRY_MODEL = "tests.AuditLogEntry"
+AUDIT_LOG_LAST_CHANGE_MODEL = "tests.LastChange"
+AUDIT_LOG_ROLLUP_MODEL = "tests.ChangeRollup"
@@ -1,8 +1,9 @@
-from typing import Any, Generator
+from typing import Any, Generator, List, Tuple
 
 import pytest
 
 from audit_log.context_managers import audit_logging
+from audit_log.signals import audit_logging_step
 from audit_log.utils import create_temporary_table_sql, drop_temporary_table_sql
 
 from ..models import AuditLogContext
@@ -24,3 +25,19 @@ def audit_logging_context(db: Any) -> Generator[AuditLogContext, None, None]:
         ),
     ) as context:
         yield context
+
+
+@pytest.fixture
+def recorded_steps() -> Generator[List[Tuple[str, str, float, int]], None, None]:
+    """
+    Record all audit logging steps reported through the signal.
+    """
+
+    steps: List[Tuple[str, str, float, int]] = []
+
+    def receiver(sender: str, step: str, duration: float, **kwargs: Any) -> None:
+        steps.append((sender, step, duration, kwargs["statements"]))
+
+    audit_logging_step.connect(receiver)
+    yield steps
+    audit_logging_step.disconnect(receiver)
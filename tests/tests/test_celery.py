@@ -0,0 +1,52 @@
+from typing import Any, List
+
+import pytest
+from celery import Celery
+from django.db import connection
+
+from audit_log.celery import AuditLoggedTask
+
+from ..models import AuditLogContext, MyAuditLoggedModel
+
+app = Celery("tests")
+
+
+@app.task(base=AuditLoggedTask, bind=True)
+def create_model(self: AuditLoggedTask, some_text: str) -> int:
+    """
+    A task that creates an audit logged model.
+    """
+
+    return MyAuditLoggedModel.objects.create(some_text=some_text).id
+
+
+@pytest.mark.django_db(transaction=True)
+def test_audit_logged_task(recorded_steps: List[Any]) -> None:
+    """
+    Test that changes made by a task are logged with the context of the task,
+    and that the context is cleared when the task is done.
+    """
+
+    try:
+        result = create_model.apply(args=["Some text"], task_id="some-task-id")
+
+        log_entry = MyAuditLoggedModel.objects.get(id=result.get()).audit_logs.get()
+        assert log_entry.context_type == "celery-task"
+        assert log_entry.context == {
+            "task": create_model.name,
+            "id": "some-task-id",
+            "retries": 0,
+        }
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {AuditLogContext._meta.db_table}")
+            assert cursor.fetchone() == (0,)
+    finally:
+        # Start over with a new connection, without the context table
+        connection.close()
+
+    assert [(sender, step) for sender, step, *_ in recorded_steps] == [
+        ("celery-task", "create_table"),
+        ("celery-task", "create_context"),
+        ("celery-task", "clear_context"),
+    ]
@@ -1,7 +1,24 @@
+import re
+import time
+from io import StringIO
+from typing import Any
+
 import pytest
 from django.core import management
+from django.db import connection
+
+from audit_log.context_managers import fallback_context
 
-from ..models import MyAuditLoggedModel
+from ..models import (
+    AuditLogEntry,
+    ChangeRollup,
+    MyAuditLoggedModel,
+    MyContextColumnsAuditLoggedModel,
+    MyManuallyAuditLoggedModel,
+    MySummaryAuditLoggedModel,
+    OtherAuditLogEntry,
+    TimeOrderedAuditLogEntry,
+)
 
 
 @pytest.mark.usefixtures("db")
@@ -34,3 +51,159 @@ def test_management_command() -> None:
             "skip_checks": True,
         },
     }
+
+
+@pytest.mark.usefixtures("db")
+def test_auditlog_stats_command_enable_tracking() -> None:
+    """
+    Test that the stats command can enable function call tracking.
+    """
+
+    stdout = StringIO()
+    management.call_command("auditlog_stats", "--enable-tracking", stdout=stdout)
+
+    assert "Enabled function call tracking for new sessions" in stdout.getvalue()
+
+
+def _wait_for_function_stats(function_name: str) -> None:
+    """
+    Wait for the statistics of the given function to be reported, as the
+    statistics of a session are only reported periodically.
+    """
+
+    for _ in range(50):
+        with connection.cursor() as cursor:
+            if connection.pg_version >= 150000:
+                cursor.execute("SELECT pg_stat_force_next_flush()")
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(
+                "SELECT 1 FROM pg_stat_user_functions WHERE funcname = %s",
+                [function_name],
+            )
+            if cursor.fetchone():
+                return
+        time.sleep(0.1)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_auditlog_stats_command() -> None:
+    """
+    Test that the stats command reports the calls of the trigger functions and
+    the size of every log entry table.
+    """
+
+    table_name = MyAuditLoggedModel._meta.db_table
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET track_functions = 'pl'")
+    try:
+        management.call_command("some_command")
+        _wait_for_function_stats(f"{table_name}_log_change")
+
+        stdout = StringIO()
+        management.call_command("auditlog_stats", stdout=stdout)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("RESET track_functions")
+
+    output = stdout.getvalue()
+    assert re.search(rf"^{table_name} +[1-9]", output, re.MULTILINE)
+    for model in [AuditLogEntry, OtherAuditLogEntry, TimeOrderedAuditLogEntry]:
+        assert f"Log entry table {model._meta.db_table}:" in output
+
+
+@pytest.mark.usefixtures("db")
+def test_summary_logged_management_command() -> None:
+    """
+    Test that a command with summary logging enabled logs a single log entry
+    for its bulk insert, and that summary mode is disabled afterwards.
+    """
+
+    management.call_command("some_summary_command")
+
+    ids = list(MySummaryAuditLoggedModel.objects.values_list("id", flat=True))
+    audit_log = AuditLogEntry.objects.get()
+    assert audit_log.context_type == "management-command"
+    assert audit_log.object_id is None
+    assert audit_log.changes == {"rows": 3, "ids": [[min(ids), max(ids)]]}
+
+    management.call_command("some_command")
+    assert AuditLogEntry.objects.count() == 2
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.django_db(transaction=True)
+def test_backfill_command(workers: int, capsys: pytest.CaptureFixture) -> None:
+    """
+    Test that the backfill command writes a snapshot entry for every row that
+    doesn't have an insert logged, and that running it again is a no-op.
+    """
+
+    for _ in range(3):
+        management.call_command("some_command")
+    AuditLogEntry.objects.all().delete()
+    management.call_command("some_command")
+
+    # The output is not passed as stdout, as it would end up in the context
+    management.call_command(
+        "auditlog_backfill",
+        "tests.MyAuditLoggedModel",
+        "--batch-size=2",
+        f"--workers={workers}",
+    )
+    assert "Backfilled 3 rows of tests.MyAuditLoggedModel" in capsys.readouterr().out
+
+    snapshots = AuditLogEntry.objects.filter(action="SNAPSHOT").order_by("object_id")
+    models = MyAuditLoggedModel.objects.order_by("id")[:3]
+    assert [(entry.object_id, entry.changes) for entry in snapshots] == [
+        (model.id, {"id": model.id, "some_text": model.some_text}) for model in models
+    ]
+    assert {entry.context["command"] for entry in snapshots} == {"auditlog_backfill"}
+
+    management.call_command("auditlog_backfill", "tests.MyAuditLoggedModel")
+    assert "Backfilled 0 rows" in capsys.readouterr().out
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backfill_command_with_context_columns(capsys: pytest.CaptureFixture) -> None:
+    """
+    Test that the backfill command works for models with columns named like
+    the columns of the context table, and logs the context of the command.
+    """
+
+    with fallback_context(context_type="test", context={}):
+        model = MyContextColumnsAuditLoggedModel.objects.create(
+            context_type="row", context={"row": True}
+        )
+    AuditLogEntry.objects.all().delete()
+
+    management.call_command(
+        "auditlog_backfill", "tests.MyContextColumnsAuditLoggedModel"
+    )
+    assert "Backfilled 1 rows" in capsys.readouterr().out
+
+    snapshot = model.audit_logs.get()
+    assert snapshot.action == "SNAPSHOT"
+    assert snapshot.context_type == "management-command"
+    assert snapshot.changes["context"] == {"row": True}
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_refresh_triggers_command(settings: Any) -> None:
+    """
+    Test that the refresh command replaces the trigger functions, so they pick
+    up changes to the settings, including the functions of models audit logged
+    with the migration operations.
+    """
+
+    del settings.AUDIT_LOG_ROLLUP_MODEL
+
+    stdout = StringIO()
+    management.call_command("auditlog_refresh_triggers", stdout=stdout)
+    assert "Refreshed the trigger functions of" in stdout.getvalue()
+
+    model = MyAuditLoggedModel.objects.create(some_text="Some text")
+    MyManuallyAuditLoggedModel.objects.create(some_text="Some text")
+
+    assert model.audit_logs.exists()
+    assert not ChangeRollup.objects.exists()
@@ -0,0 +1,140 @@
+from functools import partial
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from django.core import management
+from django.db import DataError, connection, transaction
+
+from audit_log.context_managers import audit_logging, persistent_audit_logging
+from audit_log.utils import create_temporary_table_sql, drop_temporary_table_sql
+
+from ..models import AuditLogContext, AuditLogEntry, MyAuditLoggedModel
+
+
+@pytest.mark.django_db(transaction=True)
+def test_persistent_audit_logging(recorded_steps: List[Any]) -> None:
+    """
+    Test that the context table is only created once per connection, and that
+    the context is replaced for every use.
+    """
+
+    try:
+        for task_id in ["first", "second"]:
+            task = SimpleNamespace(
+                name="tests.some_task",
+                request=SimpleNamespace(id=task_id, retries=0),
+            )
+            with persistent_audit_logging(
+                context_model=AuditLogContext,
+                create_context=partial(AuditLogContext.create_from_task, task=task),
+                entry_point="celery-task",
+            ):
+                model = MyAuditLoggedModel.objects.create(some_text=task_id)
+
+            log_entry = model.audit_logs.get()
+            assert log_entry.context_type == "celery-task"
+            assert log_entry.context == {
+                "task": "tests.some_task",
+                "id": task_id,
+                "retries": 0,
+            }
+    finally:
+        # Start over with a new connection, without the context table
+        connection.close()
+
+    assert [step for _, step, *_ in recorded_steps] == [
+        "create_table",
+        "create_context",
+        "clear_context",
+        "create_context",
+        "clear_context",
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_audit_logging_after_persistent_audit_logging(
+    recorded_steps: List[Any],
+) -> None:
+    """
+    Test that audit logging reuses the context table left on the connection by
+    persistent audit logging, instead of failing to create it again.
+    """
+
+    try:
+        with persistent_audit_logging(
+            context_model=AuditLogContext,
+            create_context=lambda: AuditLogContext.objects.create(
+                context_type="test", context={"persistent": True}
+            ),
+        ):
+            MyAuditLoggedModel.objects.create(some_text="persistent")
+
+        with audit_logging(
+            create_temporary_table_sql=create_temporary_table_sql(AuditLogContext),
+            drop_temporary_table_sql=drop_temporary_table_sql(AuditLogContext),
+            create_context=lambda: AuditLogContext.objects.create(
+                context_type="test", context={}
+            ),
+        ):
+            model = MyAuditLoggedModel.objects.create(some_text="plain")
+
+        assert model.audit_logs.get().context == {}
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT to_regclass(%s)", [f"pg_temp.{AuditLogContext._meta.db_table}"]
+            )
+            assert cursor.fetchone()[0] is not None
+    finally:
+        # Start over with a new connection, without the context table
+        connection.close()
+
+    assert [step for _, step, *_ in recorded_steps] == [
+        "create_table",
+        "create_context",
+        "clear_context",
+        "create_context",
+        "clear_context",
+    ]
+
+
+@pytest.mark.usefixtures("audit_logging_context")
+def test_nested_audit_logging(recorded_steps: List[Any]) -> None:
+    """
+    Test that an audit logging context can be nested in another one, replacing
+    its context without creating another table, and restoring it afterwards.
+    """
+
+    management.call_command("some_command")
+    model = MyAuditLoggedModel.objects.create(some_text="outer")
+
+    assert model.audit_logs.get().context_type == "test"
+    assert AuditLogEntry.objects.filter(context_type="management-command").exists()
+    assert [step for _, step, *_ in recorded_steps] == [
+        "create_context",
+        "restore_context",
+    ]
+
+
+@pytest.mark.usefixtures("audit_logging_context")
+def test_nested_audit_logging_in_failed_transaction() -> None:
+    """
+    Test that errors in a nested audit logging context propagate, instead of
+    failing to restore the outer context in the aborted transaction.
+    """
+
+    with pytest.raises(DataError, match="division by zero"):
+        with transaction.atomic():
+            with audit_logging(
+                create_temporary_table_sql=create_temporary_table_sql(AuditLogContext),
+                drop_temporary_table_sql=drop_temporary_table_sql(AuditLogContext),
+                create_context=lambda: AuditLogContext.objects.create(
+                    context_type="management-command", context={}
+                ),
+            ):
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1 / 0")
+
+    model = MyAuditLoggedModel.objects.create(some_text="outer")
+    assert model.audit_logs.get().context_type == "test"
@@ -1,15 +1,44 @@
+import hashlib
+import uuid
+from datetime import datetime, timedelta
 from typing import Callable
 
 import pytest
-from django.db import connection
+from django.contrib.contenttypes.models import ContentType
+from django.db import InternalError, connection, transaction
+from django.utils import timezone
+
+from audit_log.context_managers import fallback_context, summary_logging
+from audit_log.models import resolve_log_objects
+from audit_log.utils import create_temporary_table_sql
 
 from ..models import (
+    ArchivedAuditLogEntry,
+    AuditLogContext,
     AuditLogEntry,
+    ChangeRollup,
+    LastChange,
     MyAuditLoggedModel,
+    MyBigAuditLoggedModel,
+    MyCoalescedAuditLoggedModel,
+    MyCompactAuditLoggedModel,
     MyConvertedToAuditLoggedModel,
+    MyCustomIdAuditLoggedModel,
+    MyHistoryAuditLoggedModel,
+    MyJsonDiffAuditLoggedModel,
     MyManuallyAuditLoggedModel,
     MyNoLongerAuditLoggedModel,
     MyNoLongerManuallyAuditLoggedModel,
+    MyPartiallyAuditLoggedModel,
+    MySeparatelyAuditLoggedModel,
+    MySummaryAuditLoggedModel,
+    MyTimeOrderedAuditLoggedModel,
+    MyTruncateCountedAuditLoggedModel,
+    MyTruncatedAuditLoggedModel,
+    MyUuidAuditLoggedModel,
+    MyValuePoliciesAuditLoggedModel,
+    OtherAuditLogEntry,
+    UuidAuditLogEntry,
 )
 
 
@@ -279,3 +308,644 @@ def test_prefetch_log_entries(django_assert_num_queries: Callable) -> None:
         for model in models:
             audit_logs = model.audit_logs.all()
             assert len(audit_logs) == 2
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_condition_limits_audit_logged_rows() -> None:
+    """
+    Test that only changes to rows matching the condition on the AuditLogsField
+    are audit logged, including updates that move rows in or out of it.
+    """
+
+    internal = MyPartiallyAuditLoggedModel.objects.create(
+        some_text="Internal", is_internal=True
+    )
+    external = MyPartiallyAuditLoggedModel.objects.create(some_text="External")
+
+    assert internal.audit_logs.count() == 0
+    assert external.audit_logs.count() == 1
+
+    MyPartiallyAuditLoggedModel.objects.update(some_text="Updated")
+
+    assert internal.audit_logs.count() == 0
+    assert external.audit_logs.count() == 2
+
+    # Moving a row out of the condition is logged, but changes after that
+    # are not.
+    external.is_internal = True
+    external.save(update_fields=["is_internal"])
+    external_id = external.id
+    external.delete()
+
+    assert AuditLogEntry.objects.filter(object_id=external_id).count() == 3
+    assert AuditLogEntry.objects.latest("id").changes == {"is_internal": [False, True]}
+
+    internal_id = internal.id
+    internal.delete()
+
+    assert AuditLogEntry.objects.filter(object_id=internal_id).count() == 0
+
+
+@pytest.mark.usefixtures("transactional_db", "audit_logging_context")
+def test_changes_in_transaction_are_coalesced() -> None:
+    """
+    Test that multiple changes to the same row within a transaction are merged
+    into a single log entry, while changes in separate transactions are not.
+    """
+
+    model = MyCoalescedAuditLoggedModel.objects.create(some_text="Some text")
+
+    with transaction.atomic():
+        model.some_text = "Updated text"
+        model.save()
+        model.some_number = 1
+        model.save()
+        model.some_text = "Some text"
+        model.save()
+
+    assert model.audit_logs.count() == 2
+
+    log_entry = model.audit_logs.latest("id")
+    assert log_entry.action == "UPDATE"
+    assert log_entry.changes == {"some_number": [0, 1]}
+
+    with transaction.atomic():
+        other_model = MyCoalescedAuditLoggedModel.objects.create(some_text="Other")
+        other_model.some_number = 2
+        other_model.save()
+
+    assert other_model.audit_logs.count() == 1
+
+    log_entry = other_model.audit_logs.get()
+    assert log_entry.action == "INSERT"
+    assert log_entry.changes == {
+        "id": other_model.id,
+        "some_text": "Other",
+        "some_number": 2,
+    }
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_compact_payloads() -> None:
+    """
+    Test that inserts only log non-default values, and deletes only log the
+    primary key when the insert has been logged.
+    """
+
+    model = MyCompactAuditLoggedModel.objects.create(some_text="Some text")
+    model_id = model.id
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.changes == {"id": model_id, "some_text": "Some text"}
+
+    model.delete()
+
+    log_entry = AuditLogEntry.objects.latest("id")
+    assert log_entry.action == "DELETE"
+    assert log_entry.changes == {"id": model_id}
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_compact_delete_payload_without_insert() -> None:
+    """
+    Test that deletes log the full row if the insert was not logged.
+    """
+
+    model = MyCompactAuditLoggedModel.objects.create(
+        some_text="Some text", some_number=1
+    )
+    model_id = model.id
+    AuditLogEntry.objects.all().delete()
+
+    model.delete()
+
+    log_entry = AuditLogEntry.objects.get()
+    assert log_entry.changes == {
+        "id": model_id,
+        "some_text": "Some text",
+        "some_number": 1,
+        "some_note": None,
+    }
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_value_policies() -> None:
+    """
+    Test that values are hashed and truncated according to the value policies
+    of the model, both for inserts and updates.
+    """
+
+    model = MyValuePoliciesAuditLoggedModel.objects.create(
+        some_text="Some text", hashed_text="Secret", truncated_text="Long text"
+    )
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.changes == {
+        "id": model.id,
+        "some_text": "Some text",
+        "hashed_text": hashlib.md5(b"Secret").hexdigest(),
+        "truncated_text": "Long",
+    }
+
+    model.truncated_text = "Longer text"
+    model.save()
+
+    # The change is still logged, even though the truncated values are equal
+    log_entry = model.audit_logs.latest("id")
+    assert log_entry.changes == {"truncated_text": ["Long", "Long"]}
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_json_diff_fields() -> None:
+    """
+    Test that updates to JSON fields listed in json_diff_fields are logged with
+    only the changed paths, while other fields are logged as usual.
+    """
+
+    model = MyJsonDiffAuditLoggedModel.objects.create(
+        some_text="Some text",
+        settings={"theme": {"color": "red", "size": 1}, "tags": ["a"], "old": 1},
+    )
+
+    model.some_text = "Updated text"
+    model.settings = {"theme": {"color": "blue", "size": 1}, "tags": ["a", "b"]}
+    model.settings["new"] = None
+    model.save()
+
+    log_entry = model.audit_logs.latest("id")
+    assert log_entry.changes == {
+        "some_text": ["Some text", "Updated text"],
+        "settings": [
+            {"op": "add", "path": ["new"], "old": None, "new": None},
+            {"op": "remove", "path": ["old"], "old": 1, "new": None},
+            {"op": "replace", "path": ["tags"], "old": ["a"], "new": ["a", "b"]},
+            {
+                "op": "replace",
+                "path": ["theme", "color"],
+                "old": "red",
+                "new": "blue",
+            },
+        ],
+    }
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_truncate_is_audit_logged() -> None:
+    """
+    Test that a truncate is logged with a single log entry, optionally with the
+    number of rows that were removed.
+    """
+
+    MyTruncatedAuditLoggedModel.objects.create(some_text="Some text")
+    MyTruncateCountedAuditLoggedModel.objects.create(some_text="Some text")
+    MyTruncateCountedAuditLoggedModel.objects.create(some_text="Other text")
+    AuditLogEntry.objects.all().delete()
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {MyTruncatedAuditLoggedModel._meta.db_table}")
+        cursor.execute(f"TRUNCATE {MyTruncateCountedAuditLoggedModel._meta.db_table}")
+
+    log_entries = AuditLogEntry.objects.order_by("id")
+    assert [
+        (entry.action, entry.object_id, entry.changes) for entry in log_entries
+    ] == [("TRUNCATE", None, {}), ("TRUNCATE", None, {"rows": 2})]
+    assert [entry.content_type.model_class() for entry in log_entries] == [
+        MyTruncatedAuditLoggedModel,
+        MyTruncateCountedAuditLoggedModel,
+    ]
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_summary_logging() -> None:
+    """
+    Test that in summary mode each statement is logged with a single log entry,
+    with the ids as ranges, the number of rows and the changed columns.
+    """
+
+    with summary_logging():
+        models = MySummaryAuditLoggedModel.objects.bulk_create(
+            MySummaryAuditLoggedModel(some_text=f"Text {i}") for i in range(5)
+        )
+        first_id = models[0].id
+        MySummaryAuditLoggedModel.objects.filter(id=first_id + 2).delete()
+        MySummaryAuditLoggedModel.objects.update(some_number=1)
+        # Statements that don't change any rows are not logged
+        MySummaryAuditLoggedModel.objects.filter(id=-1).delete()
+
+    log_entries = AuditLogEntry.objects.order_by("id")
+    assert [
+        (entry.action, entry.object_id, entry.changes) for entry in log_entries
+    ] == [
+        ("INSERT", None, {"rows": 5, "ids": [[first_id, first_id + 4]]}),
+        ("DELETE", None, {"rows": 1, "ids": [[first_id + 2, first_id + 2]]}),
+        (
+            "UPDATE",
+            None,
+            {
+                "rows": 4,
+                "ids": [[first_id, first_id + 1], [first_id + 3, first_id + 4]],
+                "columns": ["some_number"],
+            },
+        ),
+    ]
+
+    # Outside of summary mode every row is logged again
+    MySummaryAuditLoggedModel.objects.update(some_number=2)
+    assert AuditLogEntry.objects.count() == 7
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_separate_log_entry_table() -> None:
+    """
+    Test that a model can be audit logged to another log entry table, and that
+    the log entries are accessed through its AuditLogsField.
+    """
+
+    model = MySeparatelyAuditLoggedModel.objects.create(some_text="Some text")
+
+    assert not AuditLogEntry.objects.exists()
+    log_entry = OtherAuditLogEntry.objects.get()
+    assert log_entry.object_id == model.id
+    assert log_entry.changes == {"id": model.id, "some_text": "Some text"}
+    assert list(model.audit_logs.all()) == [log_entry]
+
+
+@pytest.mark.usefixtures("db")
+def test_fallback_context() -> None:
+    """
+    Test that changes without audit logging context fail, unless a fallback
+    context is set, which is then logged instead.
+    """
+
+    with pytest.raises(InternalError, match="No audit logging context"):
+        with transaction.atomic():
+            MyAuditLoggedModel.objects.create(some_text="Some text")
+
+    with fallback_context(context_type="test", context={"source": "worker"}):
+        model = MyAuditLoggedModel.objects.create(some_text="Some text")
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.context_type == "test"
+    assert log_entry.context == {"source": "worker"}
+    assert log_entry.performed_by is None
+
+    # The fallback context is only set within the block
+    with pytest.raises(InternalError):
+        with transaction.atomic():
+            MyAuditLoggedModel.objects.create(some_text="Some text")
+
+
+@pytest.mark.usefixtures("db")
+def test_fallback_context_with_empty_context_table() -> None:
+    """
+    Test that an empty context table, like the one kept between uses by
+    persistent audit logging, falls back to the fallback context.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(create_temporary_table_sql(AuditLogContext))
+
+    with pytest.raises(InternalError, match="No audit logging context"):
+        with transaction.atomic():
+            MyAuditLoggedModel.objects.create(some_text="Some text")
+
+    with fallback_context(context_type="test", context={"source": "worker"}):
+        model = MyAuditLoggedModel.objects.create(some_text="Some text")
+
+    assert model.audit_logs.get().context == {"source": "worker"}
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_last_change() -> None:
+    """
+    Test that the last change of each object is kept up to date by the
+    triggers, and can be looked up for single objects and lists of objects.
+    """
+
+    first = MyAuditLoggedModel.objects.create(some_text="First")
+    second = MyAuditLoggedModel.objects.create(some_text="Second")
+    MyAuditLoggedModel.objects.filter(id=first.id).update(some_text="Changed")
+
+    last_change = first.audit_logs.last_change()
+    assert last_change.action == "UPDATE"
+    assert last_change.log_object == first
+    assert last_change.at == first.audit_logs.latest("id").at
+
+    last_changes = MyAuditLoggedModel.audit_logs.last_changes([first, second])
+    assert {pk: change.action for pk, change in last_changes.items()} == {
+        first.id: "UPDATE",
+        second.id: "INSERT",
+    }
+
+    # Deleted objects are removed
+    second.delete()
+    assert MyAuditLoggedModel.audit_logs.last_changes([first, second]).keys() == {
+        first.id
+    }
+    assert LastChange.objects.count() == 1
+
+
+def _now() -> datetime:
+    """
+    Get the current time of the database.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT clock_timestamp()")
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.usefixtures("transactional_db", "audit_logging_context")
+def test_history() -> None:
+    """
+    Test that every version of the rows is kept in the history table, so the
+    rows can be selected as they were at a given time. This needs separate
+    transactions, as the versions are timed by the start of the transaction.
+    """
+
+    first = MyHistoryAuditLoggedModel.objects.create(some_text="First")
+    second = MyHistoryAuditLoggedModel.objects.create(some_text="Second")
+    second_id = second.id
+    before_update = _now()
+
+    first.some_text = "Changed"
+    first.save()
+    second.delete()
+    after_update = _now()
+
+    assert {
+        (model.id, model.some_text)
+        for model in MyHistoryAuditLoggedModel.audit_logs.as_of(before_update)
+    } == {(first.id, "First"), (second_id, "Second")}
+    assert [
+        (model.id, model.some_text)
+        for model in MyHistoryAuditLoggedModel.audit_logs.as_of(after_update)
+    ] == [(first.id, "Changed")]
+
+    # Versions that are replaced in the same transaction are not kept
+    with transaction.atomic():
+        first.some_text = "Temporary"
+        first.save()
+        first.some_text = "Final"
+        first.save()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT data->>'some_text' FROM tests_myhistoryauditloggedmodel_history "
+            "WHERE object_id = %s ORDER BY lower(valid_period)",
+            [first.id],
+        )
+        assert cursor.fetchall() == [("First",), ("Changed",), ("Final",)]
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_changed_field_lookups() -> None:
+    """
+    Test that log entries can be looked up by the columns changed by updates,
+    and the values they were changed to, using the GIN index on the changes.
+    """
+
+    model = MyAuditLoggedModel.objects.create(some_text="draft")
+    model.some_text = "paid"
+    model.save()
+    other = MyAuditLoggedModel.objects.create(some_text="paid")
+    other.some_text = "draft"
+    other.save()
+
+    changed = AuditLogEntry.objects.changed_field("some_text")
+    assert {entry.object_id for entry in changed} == {model.id, other.id}
+    assert not AuditLogEntry.objects.changed_field("id").exists()
+
+    changed_to = AuditLogEntry.objects.changed_to("some_text", "paid")
+    assert [entry.object_id for entry in changed_to] == [model.id]
+    assert list(model.audit_logs.changed_to("some_text", "paid")) == list(changed_to)
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    for queryset in [changed, changed_to]:
+        assert "tests_auditlogentry_changes" in queryset.explain()
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_change_rollup() -> None:
+    """
+    Test that the changes are counted per day, model, user and action by the
+    triggers, with the number of rows for statements logged in summary mode.
+    """
+
+    model = MyAuditLoggedModel.objects.create(some_text="First")
+    MyAuditLoggedModel.objects.create(some_text="Second")
+    model.some_text = "Changed"
+    model.save()
+    model.delete()
+
+    with summary_logging():
+        MySummaryAuditLoggedModel.objects.bulk_create(
+            MySummaryAuditLoggedModel(some_text=f"Text {i}") for i in range(5)
+        )
+
+    assert list(
+        ChangeRollup.objects.for_model(MyAuditLoggedModel).counts("action")
+    ) == [
+        {"action": "DELETE", "changes": 1},
+        {"action": "INSERT", "changes": 2},
+        {"action": "UPDATE", "changes": 1},
+    ]
+
+    today = timezone.now().date()
+    assert list(
+        ChangeRollup.objects.between(today, today)
+        .for_model(MySummaryAuditLoggedModel)
+        .counts("performed_by", period="month")
+    ) == [{"period": today.replace(day=1), "performed_by": None, "changes": 5}]
+
+    # Every change adds a row, until they're compacted
+    rollups = ChangeRollup.objects.for_model(MyAuditLoggedModel)
+    assert rollups.count() == 4
+    counts = list(rollups.counts("action"))
+
+    rollups.filter(day=today).compact()
+
+    assert rollups.count() == 3
+    assert list(rollups.counts("action")) == counts
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_resolve_log_objects(django_assert_num_queries: Callable) -> None:
+    """
+    Test that the objects of log entries across models are fetched with a
+    query per content type, and that deleted objects are marked.
+    """
+
+    model = MyAuditLoggedModel.objects.create(some_text="Kept")
+    deleted = MyAuditLoggedModel.objects.create(some_text="Deleted")
+    deleted_id = deleted.id
+    deleted.delete()
+    other = MyCoalescedAuditLoggedModel.objects.create(some_text="Other")
+
+    ContentType.objects.clear_cache()
+    with django_assert_num_queries(5):
+        entries = resolve_log_objects(AuditLogEntry.objects.order_by("id"))
+
+    with django_assert_num_queries(0):
+        assert [(entry.log_object, entry.log_object_deleted) for entry in entries] == [
+            (model, False),
+            (None, True),
+            (None, True),
+            (other, False),
+        ]
+
+    assert [entry.object_id for entry in entries[1:3]] == [deleted_id, deleted_id]
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_timeline_for_objects() -> None:
+    """
+    Test that the log entries of several objects are returned as a single
+    timeline, which can be paginated from the last entry of a page.
+    """
+
+    model = MyAuditLoggedModel.objects.create(some_text="Parent")
+    model.some_text = "Changed"
+    model.save()
+    MyAuditLoggedModel.objects.create(some_text="Not included")
+    children = [
+        MyCoalescedAuditLoggedModel.objects.create(some_text=f"Child {i}")
+        for i in range(2)
+    ]
+
+    timeline = AuditLogEntry.objects.for_objects(
+        [
+            (MyAuditLoggedModel, [model.id]),
+            (
+                MyCoalescedAuditLoggedModel,
+                MyCoalescedAuditLoggedModel.objects.values("id"),
+            ),
+        ]
+    )
+
+    first_page = list(timeline[:2])
+    second_page = list(timeline.before(first_page[-1])[:2])
+    assert [(entry.object_id, entry.action) for entry in first_page + second_page] == [
+        (children[1].id, "INSERT"),
+        (children[0].id, "INSERT"),
+        (model.id, "UPDATE"),
+        (model.id, "INSERT"),
+    ]
+    assert not timeline.before(second_page[-1]).exists()
+    assert not AuditLogEntry.objects.for_objects([]).exists()
+
+
+@pytest.mark.usefixtures("db")
+def test_timeline_with_custom_primary_key() -> None:
+    """
+    Test that a timeline of log entries with a primary key that is not named id
+    is ordered and paginated by the primary key.
+    """
+
+    at = timezone.now()
+    entries = [
+        ArchivedAuditLogEntry.objects.create(
+            content_type=ContentType.objects.get_for_model(MyAuditLoggedModel),
+            object_id=1,
+            context_type="test",
+            context={},
+            action=action,
+            at=at,
+            changes={},
+        )
+        for action in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+    timeline = ArchivedAuditLogEntry.objects.for_objects([(MyAuditLoggedModel, [1])])
+    assert list(timeline) == entries[::-1]
+    assert list(timeline.before(entries[1])) == [entries[0]]
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_typed_object_ids() -> None:
+    """
+    Test that models with other primary key types are logged with object ids
+    of the type of the object_id column, and can be looked up through the
+    index without casts.
+    """
+
+    model = MyUuidAuditLoggedModel.objects.create(some_text="Some text")
+    model.some_text = "Changed"
+    model.save()
+    other = MyUuidAuditLoggedModel.objects.create(some_text="Other")
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.object_id == model.id
+    assert log_entry.changes == {"id": str(model.id), "some_text": "Changed"}
+    assert other.audit_logs.get().object_id == other.id
+    assert UuidAuditLogEntry.objects.count() == 2
+    assert MyUuidAuditLoggedModel.audit_logs.last_changes([model]).keys() == {model.id}
+
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+    assert "::" not in str(model.audit_logs.all().query)
+    assert "Index" in model.audit_logs.all().explain()
+
+    # A bigint primary key is cast to the integer column of the default table
+    big = MyBigAuditLoggedModel.objects.create(some_text="Some text")
+    assert [entry.object_id for entry in resolve_log_objects(big.audit_logs.all())] == [
+        big.id
+    ]
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_bigint_log_entry_ids() -> None:
+    """
+    Test that log entry models with bigint ids can be written beyond the range
+    of integers.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), 2147483648)",
+            [OtherAuditLogEntry._meta.db_table],
+        )
+
+    model = MySeparatelyAuditLoggedModel.objects.create(some_text="Some text")
+
+    assert model.audit_logs.get().id == 2147483649
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_time_ordered_log_entry_ids() -> None:
+    """
+    Test that log entry models with UUID ids get time ordered UUIDv7 ids from
+    the triggers.
+    """
+
+    with transaction.atomic():
+        model = MyTimeOrderedAuditLoggedModel.objects.create(some_text="Some text")
+        model.some_text = "Changed"
+        model.save()
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.id.version == 7
+    assert log_entry.id.variant == uuid.RFC_4122
+    assert log_entry.changes == {"id": model.id, "some_text": "Changed"}
+
+    # The first 48 bits are the time in milliseconds
+    logged_at = datetime.fromtimestamp((log_entry.id.int >> 80) / 1000, timezone.utc)
+    assert abs(logged_at - timezone.now()) < timedelta(minutes=1)
+
+
+@pytest.mark.usefixtures("db", "audit_logging_context")
+def test_coalesced_changes_with_custom_log_entry_id_column() -> None:
+    """
+    Test that changes are coalesced into log entries with a primary key column
+    that is not named id.
+    """
+
+    with transaction.atomic():
+        model = MyCustomIdAuditLoggedModel.objects.create(some_text="Some text")
+        model.some_text = "Changed"
+        model.save()
+
+    log_entry = model.audit_logs.get()
+    assert log_entry.action == "INSERT"
+    assert log_entry.changes == {"id": model.id, "some_text": "Changed"}
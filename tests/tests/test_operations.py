@@ -0,0 +1,258 @@
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import pytest
+from django.apps import apps
+from django.db import OperationalError, connection
+from django.db.migrations.state import ProjectState
+from django.test.utils import CaptureQueriesContext
+
+from audit_log.db.migrations.operations import (
+    AddAuditLogging,
+    AddAuditLoggingBulk,
+    AddAuditLoggingToApp,
+    AlterLogEntryStorage,
+)
+
+from ..models import (
+    AuditLogEntry,
+    MyManuallyAuditLoggedModel,
+    MyNoLongerAuditLoggedModel,
+    MyNonAuditLoggedModel,
+    OtherAuditLogEntry,
+)
+
+
+def _storage_options() -> Dict[str, Optional[Any]]:
+    """
+    Get the storage parameters of the log entry table and the compression
+    method of the changes column.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reloptions FROM pg_class WHERE relname = %s",
+            [AuditLogEntry._meta.db_table],
+        )
+        (reloptions,) = cursor.fetchone()
+
+        compression = None
+        if connection.pg_version >= 140000:
+            cursor.execute(
+                "SELECT attcompression FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attname = 'changes'",
+                [AuditLogEntry._meta.db_table],
+            )
+            (compression,) = cursor.fetchone()
+
+    return {"reloptions": reloptions, "compression": compression or None}
+
+
+@pytest.mark.usefixtures("db")
+def test_alter_log_entry_storage() -> None:
+    """
+    Test that the storage parameters and compression can be changed, and that
+    reversing the operation resets them.
+    """
+
+    # Compression methods can only be set from PostgreSQL 14, and lz4 is not
+    # always available, so explicitly use pglz here.
+    supports_compression = connection.pg_version >= 140000
+
+    operation = AlterLogEntryStorage(
+        model="AuditLogEntry",
+        compression="pglz" if supports_compression else None,
+        storage_parameters={"fillfactor": 100, "toast_tuple_target": 256},
+    )
+
+    state = ProjectState.from_apps(apps)
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("tests", schema_editor, state, state)
+
+    options = _storage_options()
+    assert options["reloptions"] == ["fillfactor=100", "toast_tuple_target=256"]
+    if supports_compression:
+        assert options["compression"] == "p"
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_backwards("tests", schema_editor, state, state)
+
+    assert _storage_options() == {"reloptions": None, "compression": None}
+
+
+def _sequence_cache_size() -> int:
+    """
+    Get the cache size of the id sequence of the log entry table.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT cache_size FROM pg_sequences "
+            "WHERE sequencename = %s || '_id_seq'",
+            [AuditLogEntry._meta.db_table],
+        )
+        (cache_size,) = cursor.fetchone()
+
+    return cache_size
+
+
+@pytest.mark.usefixtures("db")
+def test_alter_log_entry_sequence_cache() -> None:
+    """
+    Test that the cache size of the id sequence can be changed, and that
+    reversing the operation resets it.
+    """
+
+    operation = AlterLogEntryStorage(model="AuditLogEntry", sequence_cache=100)
+    state = ProjectState.from_apps(apps)
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("tests", schema_editor, state, state)
+
+    assert _sequence_cache_size() == 100
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_backwards("tests", schema_editor, state, state)
+
+    assert _sequence_cache_size() == 1
+
+
+def _trigger_names(table: str) -> List[str]:
+    """
+    Get the names of the triggers on the given table.
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tgname FROM pg_trigger WHERE tgrelid = %s::regclass "
+            "AND NOT tgisinternal ORDER BY tgname",
+            [table],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+@pytest.mark.usefixtures("db")
+def test_add_audit_logging_with_lock_timeout(caplog: pytest.LogCaptureFixture) -> None:
+    """
+    Test that adding audit logging with a lock timeout gives up when the table
+    stays locked, and retries until the lock is acquired otherwise.
+    """
+
+    table = MyNonAuditLoggedModel._meta.db_table
+    operation = AddAuditLogging(
+        model="MyNonAuditLoggedModel",
+        lock_timeout="50ms",
+        retries=2,
+        retry_delay=0.01,
+    )
+    state = ProjectState.from_apps(apps)
+
+    # Hold a lock that conflicts with creating triggers from another connection
+    other_connection = psycopg2.connect(**connection.get_connection_params())
+    try:
+        with other_connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {table} IN ROW EXCLUSIVE MODE")
+
+        with pytest.raises(OperationalError):
+            with connection.schema_editor() as schema_editor:
+                operation.database_forwards("tests", schema_editor, state, state)
+    finally:
+        other_connection.close()
+
+    assert len(caplog.records) == 2
+    assert "Timed out waiting for a lock" in caplog.records[0].getMessage()
+    assert _trigger_names(table) == []
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("tests", schema_editor, state, state)
+
+    assert _trigger_names(table) == [
+        "log_delete",
+        "log_insert",
+        "log_truncate",
+        "log_update",
+    ]
+
+    # The lock timeout is restored afterwards
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW lock_timeout")
+        assert cursor.fetchone() == ("0",)
+
+
+@pytest.mark.usefixtures("db")
+def test_add_audit_logging_bulk() -> None:
+    """
+    Test that audit logging can be added to several models with a single
+    statement, and removed again.
+    """
+
+    tables = [
+        MyNonAuditLoggedModel._meta.db_table,
+        MyNoLongerAuditLoggedModel._meta.db_table,
+    ]
+    operation = AddAuditLoggingBulk(
+        models=["MyNonAuditLoggedModel", "MyNoLongerAuditLoggedModel"]
+    )
+    state = ProjectState.from_apps(apps)
+
+    with CaptureQueriesContext(connection) as queries:
+        with connection.schema_editor() as schema_editor:
+            operation.database_forwards("tests", schema_editor, state, state)
+
+    # Ignore the savepoint of the schema editor
+    statements = [
+        query
+        for query in queries
+        if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))
+    ]
+    assert len(statements) == 1
+    for table in tables:
+        assert "log_insert" in _trigger_names(table)
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_backwards("tests", schema_editor, state, state)
+
+    for table in tables:
+        assert _trigger_names(table) == []
+
+
+@pytest.mark.usefixtures("db")
+def test_add_audit_logging_to_app() -> None:
+    """
+    Test that audit logging is added to the models of the app that are not
+    audit logged yet, skipping log entry models, excluded models and models
+    audit logged with AddAuditLogging in earlier migrations, and that reversing
+    it only removes audit logging from the models it added.
+    """
+
+    operation = AddAuditLoggingToApp(
+        exclude=["ArchivedAuditLogEntry", "MyNoLongerAuditLoggedModel"]
+    )
+    state = ProjectState.from_apps(apps)
+
+    expected = {"mynonauditloggedmodel", "mynolongermanuallyauditloggedmodel"}
+    # Without the migrations, this model is not audit logged yet
+    manually_audit_logged = bool(
+        _trigger_names(MyManuallyAuditLoggedModel._meta.db_table)
+    )
+    if not manually_audit_logged:
+        expected.add("mymanuallyauditloggedmodel")
+
+    assert {
+        model._meta.model_name for model in operation.get_models("tests", state)
+    } == expected
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("tests", schema_editor, state, state)
+
+    assert "log_insert" in _trigger_names(MyNonAuditLoggedModel._meta.db_table)
+    assert _trigger_names(OtherAuditLogEntry._meta.db_table) == []
+
+    with connection.schema_editor() as schema_editor:
+        operation.database_backwards("tests", schema_editor, state, state)
+
+    assert _trigger_names(MyNonAuditLoggedModel._meta.db_table) == []
+    assert bool(
+        _trigger_names(MyManuallyAuditLoggedModel._meta.db_table)
+    ) == manually_audit_logged
@@ -0,0 +1,48 @@
+from typing import Any, List
+from unittest import mock
+
+import pytest
+from django.core import management
+from django.http import QueryDict
+
+from audit_log.middleware import AuditLoggingMiddleware
+
+
+@pytest.mark.usefixtures("db")
+def test_middleware_steps_are_reported(recorded_steps: List[Any]) -> None:
+    """
+    Test that setting up and tearing down context in the middleware is reported
+    through the signal.
+    """
+
+    middleware = AuditLoggingMiddleware(mock.Mock())
+
+    request = mock.Mock()
+    request.user.id = None
+    request.method = "GET"
+    request.path = "/some/path"
+    request.GET = QueryDict()
+
+    middleware(request)
+
+    assert [step[:2] for step in recorded_steps] == [
+        ("middleware", "create_table"),
+        ("middleware", "create_context"),
+        ("middleware", "drop_table"),
+    ]
+
+    for *_, duration, statements in recorded_steps:
+        assert duration >= 0
+        assert statements == 1
+
+
+@pytest.mark.usefixtures("db")
+def test_management_command_steps_are_reported(recorded_steps: List[Any]) -> None:
+    """
+    Test that steps are tagged with the management command entry point.
+    """
+
+    management.call_command("some_command")
+
+    assert {sender for sender, *_ in recorded_steps} == {"management-command"}
+    assert len(recorded_steps) == 3
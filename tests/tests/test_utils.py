@@ -1,10 +1,25 @@
+from typing import Any
+
 import pytest
 from django.conf import settings
 from django.db import connection
+from django.db.models import Q
 
-from audit_log.utils import create_temporary_table_sql, drop_temporary_table_sql
+from audit_log.fields import get_audit_logs_field
+from audit_log.triggers import condition_sql, create_triggers_sql, drop_triggers_sql
+from audit_log.utils import (
+    create_temporary_table_sql,
+    drop_temporary_table_sql,
+    refresh_audit_logging_sql,
+)
 
-from ..models import AuditLogContext
+from ..models import (
+    AuditLogContext,
+    AuditLogEntry,
+    MyAuditLoggedModel,
+    MyCompactAuditLoggedModel,
+    MyPartiallyAuditLoggedModel,
+)
 
 
 @pytest.mark.usefixtures("db")
@@ -56,3 +71,75 @@ def test_temporary_table_sql() -> None:
 
         # Verify that PostgeSQL can actually execute this SQL
         cursor.execute(sql)
+
+
+def test_condition_sql() -> None:
+    """
+    Test that Q object conditions are compiled to SQL referencing the row
+    variable of the trigger.
+    """
+
+    assert condition_sql(audit_logged_model=MyAuditLoggedModel, row="NEW") is None
+
+    sql = condition_sql(audit_logged_model=MyPartiallyAuditLoggedModel, row="OLD")
+    assert sql == 'NOT OLD."is_internal"'
+
+
+@pytest.mark.parametrize(
+    "condition",
+    [
+        Q(some_text__startswith="public"),
+        "{row}.some_text LIKE 'public%'",
+    ],
+)
+@pytest.mark.usefixtures("audit_logging_context")
+def test_condition_sql_with_percent_signs(condition: Any, monkeypatch: Any) -> None:
+    """
+    Test that conditions with percent signs, like LIKE patterns, can be used in
+    the triggers, even though the DDL is executed with query parameters.
+    """
+
+    field = get_audit_logs_field(MyPartiallyAuditLoggedModel)
+    monkeypatch.setattr(field, "condition", condition)
+
+    sql = condition_sql(audit_logged_model=MyPartiallyAuditLoggedModel, row="NEW")
+    assert "%%" in sql
+
+    with connection.schema_editor() as schema_editor:
+        for query in drop_triggers_sql(audit_logged_model=MyPartiallyAuditLoggedModel):
+            schema_editor.execute(query)
+        for query in create_triggers_sql(
+            audit_logged_model=MyPartiallyAuditLoggedModel
+        ):
+            schema_editor.execute(query)
+
+    public = MyPartiallyAuditLoggedModel.objects.create(some_text="public text")
+    private = MyPartiallyAuditLoggedModel.objects.create(some_text="private text")
+
+    assert public.audit_logs.count() == 1
+    assert private.audit_logs.count() == 0
+
+
+@pytest.mark.usefixtures("audit_logging_context")
+def test_default_values_with_percent_signs(monkeypatch: Any) -> None:
+    """
+    Test that default values with percent signs can be used in the triggers
+    of models that only log columns that differ from their default on insert.
+    """
+
+    field = MyCompactAuditLoggedModel._meta.get_field("some_note")
+    monkeypatch.setattr(field, "default", "50% off")
+
+    with connection.schema_editor() as schema_editor:
+        for query in refresh_audit_logging_sql(
+            audit_logged_model=MyCompactAuditLoggedModel,
+            context_model=AuditLogContext,
+            log_entry_model=AuditLogEntry,
+        ):
+            schema_editor.execute(query)
+
+    model = MyCompactAuditLoggedModel.objects.create(
+        some_text="Some text", some_note="50% off"
+    )
+
+    assert model.audit_logs.get().changes == {"id": model.id, "some_text": "Some text"}